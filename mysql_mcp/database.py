@@ -5,25 +5,176 @@
 MySQL数据库连接和操作模块
 
 这个模块提供了与MySQL数据库交互的基本功能，包括：
-- 建立和管理数据库连接
+- 建立和管理数据库连接池
 - 执行SQL查询
 - 获取数据库模式信息
 - 处理查询结果
 """
 
+import threading
 import time
-from typing import Dict, List, Any, Optional, Union, Tuple
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+from itertools import groupby
+from typing import Dict, List, Any, Iterator, Optional, Union, Tuple
 
 import mysql.connector
 from loguru import logger
 from mysql.connector import Error as MySQLError
+from mysql.connector import pooling
+
+from mysql_mcp.security import limit_position, parse_operation
+
+
+# 返回结果集的查询操作
+READ_OPS = frozenset({"SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN", "WITH"})
+
+
+def _iter_chunks(cursor, size: int, limit: Optional[int] = None) -> Iterator[List[Any]]:
+    """按块读取游标中的结果行
+    
+    Args:
+        cursor: 数据库游标
+        size: 每块的最大行数
+        limit: 最多读取的行数，为None时读取全部结果
+    
+    Yields:
+        List[Any]: 一块结果行
+    """
+    fetched = 0
+    while limit is None or fetched < limit:
+        wanted = size if limit is None else min(size, limit - fetched)
+        chunk = cursor.fetchmany(wanted)
+        if not chunk:
+            return
+        fetched += len(chunk)
+        yield chunk
+        # 返回的行数不足说明结果集已读完，无需再发起一次读取
+        if len(chunk) < wanted:
+            return
+
+
+def _push_down_limit(query: str, op: Optional[str], max_rows: int) -> str:
+    """为没有LIMIT的SELECT语句追加LIMIT max_rows + 1
+    
+    服务器因此不必生成、排序和发送超出需要的行，多出的一行用于判断是否还有更多结果。
+    语句以分号结束时，LIMIT插入到分号之前。
+    """
+    position = limit_position(query) if op == "SELECT" else None
+    if position is None:
+        return query
+    # 换行可以避免语句末尾的单行注释吞掉LIMIT
+    return f"{query[:position]}\nLIMIT {int(max_rows) + 1}{query[position:]}"
+
+
+class _OpenCursor:
+    """分页查询中保持打开的服务端游标"""
+    
+    __slots__ = ("cursor", "connection", "last_used", "lock", "closed")
+    
+    def __init__(self, cursor, connection):
+        self.cursor = cursor
+        self.connection = connection
+        self.last_used = time.monotonic()
+        # 同一连接不能被多个线程同时读取
+        self.lock = threading.Lock()
+        self.closed = False
+
+
+class QueryStream:
+    """流式读取的查询结果
+    
+    查询在创建前已经执行，结果行通过fetch()从非缓冲游标逐块读取，内存占用只与块大小有关。
+    row_count、has_more和execution_time在结果读完后才确定。
+    """
+    
+    def __init__(self, connection, cursor, max_rows: int, chunk_size: int, start_time: float):
+        self._connection = connection
+        self._cursor = cursor
+        self._max_rows = max_rows
+        self._chunk_size = chunk_size
+        self._start_time = start_time
+        self._fetched = 0
+        self._failed = False
+        # fetch()和close()可能在不同线程中调用
+        self._lock = threading.Lock()
+        
+        self.columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        self.row_count = 0
+        self.has_more = False
+        self.execution_time: Optional[float] = None
+    
+    def fetch(self) -> List[Dict[str, Any]]:
+        """读取下一块结果行
+        
+        最多读取max_rows + 1行，多出的一行只用于判断是否还有更多结果，不会返回。
+        结果读完后自动释放连接。
+        
+        Returns:
+            List[Dict[str, Any]]: 一块结果行，为空表示已读完
+        """
+        with self._lock:
+            if self._cursor is None:
+                return []
+            
+            wanted = min(self._chunk_size, self._max_rows + 1 - self._fetched)
+            try:
+                chunk = self._cursor.fetchmany(wanted)
+            except Exception:
+                # 读取失败后游标处于不确定状态，不能再读取剩余结果
+                self._failed = True
+                self._release()
+                raise
+            self._fetched += len(chunk)
+            
+            if self._fetched > self._max_rows:
+                self.has_more = True
+                del chunk[self._max_rows - self.row_count:]
+                self._release()
+            elif len(chunk) < wanted:
+                # 返回的行数不足说明结果集已读完
+                self._release()
+            
+            self.row_count += len(chunk)
+            return chunk
+    
+    def close(self) -> None:
+        """丢弃未读的结果并把连接归还到连接池"""
+        with self._lock:
+            self._release()
+    
+    def _release(self) -> None:
+        """释放游标和连接，调用方需持有_lock"""
+        cursor, self._cursor = self._cursor, None
+        if cursor is None:
+            return
+        self.execution_time = time.time() - self._start_time
+        try:
+            # 非缓冲游标必须读完剩余结果才能释放，逐块丢弃以免占用内存
+            if not self._failed:
+                for _ in _iter_chunks(cursor, self._chunk_size):
+                    pass
+            cursor.close()
+        except Exception as e:
+            # 释放在响应结束或客户端断开时进行，错误不能再抛给调用方
+            logger.warning(f"释放流式查询游标失败: {e}")
+        finally:
+            try:
+                self._connection.close()
+            except Exception as e:
+                logger.warning(f"归还流式查询连接失败: {e}")
 
 
 class MySQLDatabase:
     """MySQL数据库连接和操作类"""
     
-    def __init__(self, host: str, port: int, user: str, password: str, database: str):
-        """初始化数据库连接
+    # 后台清理空闲游标的间隔（秒）
+    CURSOR_REAP_INTERVAL = 30
+    
+    def __init__(self, host: str, port: int, user: str, password: str, database: str,
+                 pool_size: int = 8, max_cursors: int = 16, cursor_timeout: int = 30):
+        """初始化数据库连接池
         
         Args:
             host: 数据库主机地址
@@ -31,85 +182,152 @@ class MySQLDatabase:
             user: 数据库用户名
             password: 数据库密码
             database: 数据库名称
+            pool_size: 连接池大小，即可以同时执行的查询数
+            max_cursors: 分页查询同时打开的最大游标数，超出时关闭最久未使用的游标
+            cursor_timeout: 分页游标的空闲超时时间（秒）
         """
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.database = database
-        self.connection = None
+        self.pool_size = pool_size
+        self.max_cursors = max_cursors
+        self.cursor_timeout = cursor_timeout
+        self.pool: Optional[pooling.MySQLConnectionPool] = None
+        self._cursors: "OrderedDict[str, _OpenCursor]" = OrderedDict()
+        self._cursors_lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._reaper_stop = threading.Event()
         self.connect()
     
+    def _connection_config(self) -> Dict[str, Any]:
+        """获取数据库连接参数"""
+        return {
+            "host": self.host,
+            "port": self.port,
+            "user": self.user,
+            "password": self.password,
+            "database": self.database
+        }
+    
+    def _new_connection(self):
+        """创建一个不属于连接池的独立数据库连接"""
+        return mysql.connector.connect(**self._connection_config())
+    
     def connect(self) -> None:
-        """建立数据库连接"""
+        """建立数据库连接池"""
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database
+            self.pool = pooling.MySQLConnectionPool(
+                pool_name="mcp",
+                pool_size=self.pool_size,
+                **self._connection_config()
             )
-            logger.info(f"成功连接到MySQL数据库: {self.host}:{self.port}/{self.database}")
+            logger.info(f"成功连接到MySQL数据库: {self.host}:{self.port}/{self.database}，连接池大小: {self.pool_size}")
         except MySQLError as e:
             logger.error(f"连接MySQL数据库失败: {e}")
             raise
     
-    def is_connected(self) -> bool:
-        """检查数据库连接是否有效
+    def ping(self) -> bool:
+        """检查数据库是否可用
+        
+        连接池在取出连接时会自动重连已断开的连接，这里只需要确认能取到可用的连接。
         
         Returns:
-            bool: 连接是否有效
+            bool: 数据库是否可用
         """
-        if self.connection is None:
+        try:
+            with closing(self.pool.get_connection()) as connection:
+                connection.ping(reconnect=True)
+            return True
+        except MySQLError as e:
+            logger.error(f"数据库连接检查失败: {e}")
             return False
-        return self.connection.is_connected()
-    
-    def reconnect_if_needed(self) -> None:
-        """如果连接已断开，则重新连接"""
-        if not self.is_connected():
-            logger.warning("数据库连接已断开，尝试重新连接...")
-            self.connect()
     
     def close(self) -> None:
-        """关闭数据库连接"""
-        if self.connection and self.is_connected():
-            self.connection.close()
+        """关闭数据库连接池"""
+        self._reaper_stop.set()
+        with self._cursors_lock:
+            entries = list(self._cursors.values())
+            self._cursors.clear()
+        for entry in entries:
+            self._discard_cursor(entry)
+        
+        if self.pool is not None:
+            # MySQLConnectionPool没有公开的关闭方法，mysql.connector自身也使用该方法清空连接池
+            self.pool._remove_connections()
             logger.info("数据库连接已关闭")
-            self.connection = None
+            self.pool = None
     
-    def execute_query(self, query: str, max_rows: int = 1000) -> Dict[str, Any]:
+    def execute_query(self, query: str, max_rows: int = 1000, arraysize: int = 1000,
+                      op: Optional[str] = None, as_dict: bool = True) -> Dict[str, Any]:
         """执行SQL查询
         
+        查询使用非缓冲（服务端）游标按块读取结果，客户端内存只与返回的行数有关，
+        而与结果集的总大小无关。没有LIMIT的SELECT语句会追加LIMIT max_rows + 1，
+        使服务器不必生成、排序和发送超出需要的行。
+        
         Args:
             query: SQL查询语句
             max_rows: 最大返回行数
+            arraysize: 每次从服务器读取的行数
+            op: 已解析的操作类型，通常来自SecurityManager.validate_query，为None时重新解析
+            as_dict: 结果行是否为字典，为False时返回元组，省去每行构造字典的开销
         
         Returns:
             Dict[str, Any]: 查询结果
         """
-        self.reconnect_if_needed()
-        
         start_time = time.time()
-        cursor = self.connection.cursor(dictionary=True)
+        
+        if op is None:
+            op = parse_operation(query)
+        query = _push_down_limit(query, op, max_rows)
+        
+        try:
+            with closing(self.pool.get_connection()) as connection:
+                return self._execute(connection, query, op, max_rows, arraysize, as_dict, start_time)
+        except MySQLError as e:
+            logger.error(f"执行查询失败: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def _execute(self, connection, query: str, op: Optional[str], max_rows: int, arraysize: int,
+                 as_dict: bool, start_time: float) -> Dict[str, Any]:
+        """在指定连接上执行SQL查询并整理结果"""
+        cursor = connection.cursor(dictionary=as_dict, buffered=False)
+        cursor.arraysize = arraysize
         
         try:
             # 执行查询
             cursor.execute(query)
             
-            # 处理不同类型的查询
-            if query.strip().upper().startswith("SELECT") or \
-               query.strip().upper().startswith("SHOW") or \
-               query.strip().upper().startswith("DESCRIBE"):
-                # 获取结果
-                rows = cursor.fetchmany(max_rows)
-                has_more = cursor.fetchone() is not None
+            # 按是否返回结果集处理，CALL、CHECK TABLE、HELP等操作类型之外的语句同样可能返回结果行
+            if cursor.with_rows:
+                rows = []
+                has_more = False
+                try:
+                    # 获取结果，多读取一行用于判断是否还有更多结果
+                    for chunk in _iter_chunks(cursor, arraysize, max_rows + 1):
+                        rows.extend(chunk)
+                    has_more = len(rows) > max_rows
+                    del rows[max_rows:]
+                finally:
+                    # 非缓冲游标必须读完剩余结果才能释放，逐块丢弃以免占用内存
+                    if has_more:
+                        for _ in _iter_chunks(cursor, arraysize):
+                            pass
                 
                 # 获取列信息
                 columns = []
                 if cursor.description:
                     columns = [desc[0] for desc in cursor.description]
                 
+                # 返回结果行的存储过程等可能修改了数据
+                if op not in READ_OPS:
+                    connection.commit()
+                
                 execution_time = time.time() - start_time
                 
                 return {
@@ -122,7 +340,7 @@ class MySQLDatabase:
                 }
             else:
                 # 对于非查询操作，提交事务并返回影响的行数
-                self.connection.commit()
+                connection.commit()
                 execution_time = time.time() - start_time
                 
                 return {
@@ -130,71 +348,248 @@ class MySQLDatabase:
                     "affected_rows": cursor.rowcount,
                     "execution_time": execution_time
                 }
-        except MySQLError as e:
-            logger.error(f"执行查询失败: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
         finally:
             cursor.close()
     
+    def stream_query(self, query: str, max_rows: int = 1000, chunk_size: int = 1000,
+                     op: Optional[str] = None) -> QueryStream:
+        """以流式方式执行返回结果集的查询
+        
+        与execute_query不同，结果行不会一次性读入内存，而是由调用方通过QueryStream.fetch()
+        逐块读取。读取期间占用连接池中的一个连接，读完或调用close()后归还。
+        
+        Args:
+            query: SQL查询语句
+            max_rows: 最大返回行数
+            chunk_size: 每次从服务器读取的行数
+            op: 已解析的操作类型，为None时重新解析
+        
+        Returns:
+            QueryStream: 流式查询结果
+        
+        Raises:
+            MySQLError: 查询执行失败
+        """
+        start_time = time.time()
+        
+        if op is None:
+            op = parse_operation(query)
+        query = _push_down_limit(query, op, max_rows)
+        
+        connection = self.pool.get_connection()
+        try:
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            cursor.execute(query)
+        except Exception:
+            connection.close()
+            raise
+        return QueryStream(connection, cursor, max_rows, chunk_size, start_time)
+    
     def get_schema(self, allowed_tables: List[str] = None) -> Dict[str, Any]:
         """获取数据库模式信息
         
+        所有表的列信息通过一次INFORMATION_SCHEMA.COLUMNS查询获取，
+        而不是对每个表单独执行DESCRIBE。
+        
         Args:
             allowed_tables: 允许的表列表，如果为空则获取所有表
         
         Returns:
-            Dict[str, Any]: 数据库模式信息
+            Dict[str, Any]: 数据库模式信息，查询失败时tables为空，并包含success为False和error字段
         """
-        self.reconnect_if_needed()
-        
         schema = {
             "database": self.database,
             "tables": []
         }
         
+        # 获取所有表的列信息
+        query = """
+        SELECT
+            TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE,
+            COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+        FROM
+            INFORMATION_SCHEMA.COLUMNS
+        WHERE
+            TABLE_SCHEMA = %s
+        """
+        params = [self.database]
+        
+        # 如果指定了允许的表，则只查询这些表
+        if allowed_tables:
+            query += " AND TABLE_NAME IN (" + ", ".join(["%s"] * len(allowed_tables)) + ")"
+            params.extend(allowed_tables)
+        
+        query += " ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        
         try:
-            # 获取所有表
-            tables_query = "SHOW TABLES"
-            tables_result = self.execute_query(tables_query)
-            
-            if not tables_result["success"]:
-                return schema
-            
-            tables = [list(row.values())[0] for row in tables_result["rows"]]
-            
-            # 如果指定了允许的表，则过滤表列表
-            if allowed_tables:
-                tables = [table for table in tables if table in allowed_tables]
+            with closing(self.pool.get_connection()) as connection, \
+                    closing(connection.cursor(buffered=True)) as cursor:
+                cursor.execute(query, tuple(params))
+                rows = cursor.fetchall()
+        except MySQLError as e:
+            logger.error(f"获取数据库模式失败: {e}")
+            # 标记失败，避免空的表列表被当作模式缓存下来
+            return {**schema, "success": False, "error": str(e)}
+        
+        # 按表名分组生成每个表的结构
+        for table, columns in groupby(rows, key=lambda row: row[0]):
+            table_info = {
+                "name": table,
+                "columns": []
+            }
             
-            # 获取每个表的结构
-            for table in tables:
-                table_info = {
-                    "name": table,
-                    "columns": []
-                }
-                
-                # 获取表结构
-                columns_query = f"DESCRIBE `{table}`"
-                columns_result = self.execute_query(columns_query)
-                
-                if columns_result["success"]:
-                    for column in columns_result["rows"]:
-                        column_info = {
-                            "name": column["Field"],
-                            "type": column["Type"],
-                            "nullable": column["Null"] == "YES",
-                            "key": column["Key"],
-                            "default": column["Default"],
-                            "extra": column["Extra"]
-                        }
-                        table_info["columns"].append(column_info)
-                
-                schema["tables"].append(table_info)
+            for _, name, type_, nullable, key, default, extra in columns:
+                table_info["columns"].append({
+                    "name": name,
+                    "type": type_,
+                    "nullable": nullable == "YES",
+                    "key": key,
+                    "default": default,
+                    "extra": extra
+                })
             
-            return schema
+            schema["tables"].append(table_info)
+        
+        return schema
+    
+    def get_schema_version(self) -> Optional[Tuple[Any, ...]]:
+        """获取数据库模式的版本标识
+        
+        版本由INFORMATION_SCHEMA.TABLES中表的数量以及最近的创建和更新时间组成，
+        任何一项变化都说明缓存的模式信息可能已经过期。
+        
+        创建、删除和重命名表，以及重建表的ALTER TABLE（ALGORITHM=COPY或重建表的INPLACE操作）会改变版本；
+        ALGORITHM=INSTANT的列变更（如MySQL 8.0中的ADD COLUMN、RENAME COLUMN、修改默认值）
+        不改变CREATE_TIME和表数量，UPDATE_TIME只随数据修改变化，因此不会使缓存失效，
+        这类变更后需要调用SchemaManager.clear_cache()或重启服务器。
+        
+        Returns:
+            Optional[Tuple[Any, ...]]: 模式版本，查询失败时返回None
+        """
+        query = """
+        SELECT MAX(UPDATE_TIME), MAX(CREATE_TIME), COUNT(*)
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s
+        """
+        
+        try:
+            with closing(self.pool.get_connection()) as connection, \
+                    closing(connection.cursor(buffered=True)) as cursor:
+                cursor.execute(query, (self.database,))
+                return tuple(cursor.fetchone())
         except MySQLError as e:
-            logger.error(f"获取数据库模式失败: {e}")
-            return schema
\ No newline at end of file
+            logger.error(f"获取数据库模式版本失败: {e}")
+            return None
+    
+    def open_cursor(self, query: str) -> str:
+        """为分页查询打开一个服务端游标
+        
+        每个游标使用独立的连接，查询只执行一次，后续通过fetch_cursor逐页读取，
+        避免LIMIT/OFFSET分页对每一页重复扫描和排序。
+        
+        Args:
+            query: SQL查询语句
+        
+        Returns:
+            str: 游标ID
+        
+        Raises:
+            MySQLError: 查询执行失败
+            ValueError: 查询没有返回结果集
+        """
+        connection = self._new_connection()
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(query)
+            if cursor.description is None:
+                raise ValueError("查询没有返回结果集")
+        except Exception:
+            self._discard_cursor(_OpenCursor(cursor, connection))
+            raise
+        
+        cursor_id = uuid.uuid4().hex
+        evicted = []
+        with self._cursors_lock:
+            self._cursors[cursor_id] = _OpenCursor(cursor, connection)
+            while len(self._cursors) > self.max_cursors:
+                evicted_id, entry = self._cursors.popitem(last=False)
+                logger.warning(f"打开的游标过多，关闭最久未使用的游标: {evicted_id}")
+                evicted.append(entry)
+            self._start_reaper()
+        
+        for entry in evicted:
+            self._discard_cursor(entry)
+        return cursor_id
+    
+    def fetch_cursor(self, cursor_id: str, n: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """从分页游标读取下一页结果
+        
+        Args:
+            cursor_id: 游标ID
+            n: 读取的行数
+        
+        Returns:
+            Tuple[List[Dict[str, Any]], bool]: 结果行以及游标是否已读完
+        
+        Raises:
+            KeyError: 游标不存在或已过期
+        """
+        with self._cursors_lock:
+            entry = self._cursors.get(cursor_id)
+            if entry is None:
+                raise KeyError(cursor_id)
+            self._cursors.move_to_end(cursor_id)
+        
+        with entry.lock:
+            if entry.closed:
+                raise KeyError(cursor_id)
+            rows = entry.cursor.fetchmany(n)
+            entry.last_used = time.monotonic()
+        
+        exhausted = len(rows) < n
+        if exhausted:
+            self.close_cursor(cursor_id)
+        return rows, exhausted
+    
+    def close_cursor(self, cursor_id: str) -> None:
+        """关闭分页游标
+        
+        Args:
+            cursor_id: 游标ID
+        """
+        with self._cursors_lock:
+            entry = self._cursors.pop(cursor_id, None)
+        if entry is not None:
+            self._discard_cursor(entry)
+    
+    def _discard_cursor(self, entry: _OpenCursor) -> None:
+        """关闭游标及其连接，未读完的结果随连接一起丢弃"""
+        with entry.lock:
+            if entry.closed:
+                return
+            entry.closed = True
+            for resource in (entry.cursor, entry.connection):
+                try:
+                    resource.close()
+                except Exception as e:
+                    logger.warning(f"关闭分页游标失败: {e}")
+    
+    def _start_reaper(self) -> None:
+        """启动后台线程定期关闭空闲游标，调用方需持有_cursors_lock"""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper_stop.clear()
+        self._reaper = threading.Thread(target=self._reap_cursors, name="mcp-cursor-reaper", daemon=True)
+        self._reaper.start()
+    
+    def _reap_cursors(self) -> None:
+        """关闭空闲时间超过cursor_timeout的游标"""
+        while not self._reaper_stop.wait(self.CURSOR_REAP_INTERVAL):
+            deadline = time.monotonic() - self.cursor_timeout
+            with self._cursors_lock:
+                expired = [cursor_id for cursor_id, entry in self._cursors.items()
+                           if entry.last_used < deadline]
+                entries = [self._cursors.pop(cursor_id) for cursor_id in expired]
+            for cursor_id, entry in zip(expired, entries):
+                logger.info(f"关闭空闲游标: {cursor_id}")
+                self._discard_cursor(entry)
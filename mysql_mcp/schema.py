@@ -8,25 +8,83 @@
 - 解析数据库模式
 - 生成表结构描述
 - 分析表关系
+- 缓存模式信息
 """
 
-from typing import Dict, List, Any, Optional
+import random
+import threading
+import time
+from typing import Dict, List, Any, Optional, Callable, Sequence, Tuple, Union
 
 from loguru import logger
 
+from mysql_mcp.database import MySQLDatabase
+
+
+# 表关系的字段，与get_table_relations工具查询的列顺序一致
+RELATION_FIELDS = ("table_name", "column_name", "referenced_table", "referenced_column")
+
 
 class SchemaManager:
     """数据库模式管理器类"""
     
-    def __init__(self, database_name: str):
+    def __init__(self, database_name: str, cache_enabled: bool = True,
+                 database: Optional[MySQLDatabase] = None):
         """初始化模式管理器
         
         Args:
             database_name: 数据库名称
+            cache_enabled: 是否缓存模式查询结果
+            database: MySQL数据库连接，设置后get_table_info会按需查询未加载的表
         """
         self.database_name = database_name
+        self.cache_enabled = cache_enabled
+        self.database = database
         self.tables = {}
         self.relations = []
+        self._cache: Dict[str, Tuple[Tuple[Any, ...], Dict[str, Any]]] = {}
+        self._cache_lock = threading.Lock()
+    
+    def get_or_refresh(self, database: MySQLDatabase, key: str,
+                       fetcher: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """获取缓存的模式查询结果，模式发生变化时重新查询
+        
+        每次调用只执行一次很小的模式版本查询，版本未变化时直接返回缓存结果。
+        
+        Args:
+            database: MySQL数据库连接
+            key: 缓存键
+            fetcher: 缓存失效时用于重新查询的函数
+        
+        Returns:
+            Dict[str, Any]: 模式查询结果
+        """
+        if not self.cache_enabled:
+            return fetcher()
+        
+        version = database.get_schema_version()
+        if version is None:
+            return fetcher()
+        
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            logger.debug(f"使用缓存的模式信息: {key}")
+            return cached[1]
+        
+        result = fetcher()
+        
+        # 查询失败的结果不缓存
+        if result.get("success", True):
+            with self._cache_lock:
+                self._cache[key] = (version, result)
+        
+        return result
+    
+    def clear_cache(self) -> None:
+        """清空模式缓存"""
+        with self._cache_lock:
+            self._cache.clear()
     
     def update_schema(self, schema_data: Dict[str, Any]) -> None:
         """更新数据库模式信息
@@ -45,25 +103,63 @@ class SchemaManager:
         
         logger.info(f"更新了 {len(schema_data['tables'])} 个表的模式信息")
     
-    def update_relations(self, relations_data: List[Dict[str, Any]]) -> None:
+    def update_relations(self, relations_data: List[Union[Dict[str, Any], Sequence[Any]]]) -> None:
         """更新表关系信息
         
         Args:
-            relations_data: 表关系数据
+            relations_data: 表关系数据，每行可以是字典，也可以是按RELATION_FIELDS
+                顺序排列的元组（即execute_query(..., as_dict=False)返回的结果行）
         """
-        self.relations = relations_data
+        self.relations = [
+            relation if isinstance(relation, dict) else dict(zip(RELATION_FIELDS, relation))
+            for relation in relations_data
+        ]
         logger.info(f"更新了 {len(relations_data)} 个表关系信息")
     
     def get_table_info(self, table_name: str) -> Optional[Dict[str, Any]]:
         """获取表信息
         
+        表信息未加载时，只从INFORMATION_SCHEMA查询这一个表并缓存结果。
+        
         Args:
             table_name: 表名
         
         Returns:
             Optional[Dict[str, Any]]: 表信息，如果表不存在则返回None
         """
-        return self.tables.get(table_name)
+        table_info = self.tables.get(table_name)
+        if table_info is not None or self.database is None:
+            return table_info
+        
+        schema_data = self.database.get_schema([table_name])
+        for table in schema_data["tables"]:
+            if table["name"] == table_name:
+                self.tables[table_name] = table
+                return table
+        return None
+    
+    def prewarm(self, table_names: Optional[List[str]] = None, jitter_seconds: float = 60) -> None:
+        """预先加载模式信息，通常在后台线程中调用
+        
+        通过一次INFORMATION_SCHEMA查询填充get_schema工具和/schema接口读取的"schema"缓存，
+        同时把各表信息保存到tables中。开始前随机等待一段时间，避免同时部署的多个服务器同时查询数据库。
+        
+        Args:
+            table_names: 允许访问的表，与get_schema工具使用的表列表一致，为空时加载整个数据库的模式
+            jitter_seconds: 开始前随机等待的最长时间（秒）
+        """
+        if self.database is None:
+            return
+        
+        if jitter_seconds > 0:
+            time.sleep(random.random() * jitter_seconds)
+        
+        try:
+            database = self.database
+            schema_data = self.get_or_refresh(database, "schema", lambda: database.get_schema(table_names))
+            self.update_schema(schema_data)
+        except Exception as e:
+            logger.error(f"预加载模式信息失败: {e}")
     
     def get_table_relations(self, table_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """获取表关系
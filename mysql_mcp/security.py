@@ -11,11 +11,244 @@
 """
 
 import re
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
 from loguru import logger
 
 
+# 危险操作模式
+DANGEROUS_PATTERNS = [
+    r'\bDROP\b',
+    r'\bTRUNCATE\b',
+    r'\bDELETE\b\s+(?!WHERE)',  # DELETE没有WHERE条件
+    r'\bUPDATE\b\s+(?!WHERE)',  # UPDATE没有WHERE条件
+    r'--',  # SQL注释
+    r';\s*\w',  # 多条语句
+    r'\bEXEC\b',
+    r'\bXP_\w',
+    r'\bSYSTEM\b'
+]
+
+# MySQL标识符允许的字符，最长64个字符
+_IDENTIFIER_RE = re.compile(r'[A-Za-z0-9_$]{1,64}')
+
+# 词法单元类型
+TOKEN_WORD = "word"        # 关键字或未引用的标识符
+TOKEN_IDENT = "ident"      # 反引号引用的标识符
+TOKEN_STRING = "string"    # 字符串字面量
+TOKEN_SYMBOL = "symbol"    # 括号、逗号等单个字符
+
+# 其后紧跟表名的关键字，TABLE为MySQL 8.0.19起支持的TABLE语句
+_TABLE_KEYWORDS = frozenset({"FROM", "JOIN", "STRAIGHT_JOIN", "UPDATE", "INTO", "TABLE"})
+
+# 结束FROM子句（或多表UPDATE）中逗号分隔的表列表的关键字
+_CLAUSE_KEYWORDS = frozenset({
+    "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "WINDOW",
+    "FOR", "LOCK", "INTO", "SET", "VALUES"
+})
+
+# 出现在语句顶层时，不能在语句末尾追加LIMIT的关键字或符号
+_NO_APPEND_LIMIT = frozenset({"LIMIT", "INTO", "FOR", "LOCK", "PROCEDURE"})
+
+
+def tokenize(query: str) -> Iterator[Tuple[str, str]]:
+    """对SQL语句进行词法分析
+    
+    单次扫描查询字符串，跳过空白、注释（-- 、#、/* */）并识别字符串字面量，
+    因此注释和字符串中的内容不会被当作关键字或表名。
+    MySQL会执行/*! ... */中的内容，所以这类注释中的内容按普通SQL处理。
+    
+    Args:
+        query: SQL查询语句
+    
+    Yields:
+        Tuple[str, str]: 词法单元类型和文本，关键字按原样返回，引用的标识符去掉反引号
+    """
+    for kind, text, _ in _scan(query):
+        yield kind, text
+
+
+def _scan(query: str) -> Iterator[Tuple[str, str, int]]:
+    """tokenize的实现，同时返回每个词法单元在查询字符串中的起始位置"""
+    i = 0
+    n = len(query)
+    while i < n:
+        ch = query[i]
+        
+        if ch.isspace():
+            i += 1
+        elif ch == "#" or (query.startswith("--", i) and (i + 2 == n or query[i + 2].isspace())):
+            # 单行注释
+            end = query.find("\n", i)
+            i = n if end < 0 else end + 1
+        elif query.startswith("/*!", i):
+            # 可执行注释，跳过标记和可选的版本号，内容按SQL处理
+            i += 3
+            while i < n and query[i].isdigit():
+                i += 1
+        elif query.startswith("/*", i):
+            # 多行注释
+            end = query.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif query.startswith("*/", i):
+            # 可执行注释的结束标记
+            i += 2
+        elif ch in "'\"`":
+            # 字符串字面量或引用的标识符，引号可以通过重复或反斜杠转义
+            j = i + 1
+            while j < n:
+                if query[j] == "\\" and ch != "`":
+                    j += 2
+                elif query[j] == ch:
+                    if j + 1 < n and query[j + 1] == ch:
+                        j += 2
+                    else:
+                        break
+                else:
+                    j += 1
+            if ch == "`":
+                yield TOKEN_IDENT, query[i + 1:j].replace("``", "`"), i
+            else:
+                yield TOKEN_STRING, query[i:j + 1], i
+            i = j + 1
+        elif ch.isalnum() or ch in "_$":
+            j = i + 1
+            while j < n and (query[j].isalnum() or query[j] in "_$"):
+                j += 1
+            yield TOKEN_WORD, query[i:j], i
+            i = j
+        else:
+            yield TOKEN_SYMBOL, ch, i
+            i += 1
+
+
+def _extract_tables(tokens: List[Tuple[str, str]]) -> List[str]:
+    """提取查询中引用的表名
+    
+    识别FROM、JOIN、STRAIGHT_JOIN、UPDATE、INTO、TABLE之后的表名，以及FROM子句和多表UPDATE中逗号分隔的其他表，
+    db.table形式的表名作为一个整体返回。括号中的表引用和子查询中的表同样会被识别。
+    
+    Args:
+        tokens: tokenize产生的词法单元
+    
+    Returns:
+        List[str]: 表名列表
+    """
+    tables = []
+    # 每一层括号是否处于表列表中
+    in_table_list = [False]
+    expect_table = False
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        keyword = text.upper() if kind == TOKEN_WORD else None
+        
+        if expect_table and kind in (TOKEN_WORD, TOKEN_IDENT):
+            # 合并db.table形式的限定名
+            name = text
+            while i + 2 < len(tokens) and tokens[i + 1] == (TOKEN_SYMBOL, ".") \
+                    and tokens[i + 2][0] in (TOKEN_WORD, TOKEN_IDENT):
+                name += "." + tokens[i + 2][1]
+                i += 2
+            tables.append(name)
+            expect_table = False
+        elif keyword in _TABLE_KEYWORDS:
+            # SHOW TABLE STATUS中的TABLE之后不是表名
+            expect_table = not (keyword == "TABLE" and i > 0 and tokens[i - 1][1].upper() == "SHOW")
+            if keyword in ("FROM", "UPDATE"):
+                in_table_list[-1] = True
+        elif expect_table and kind == TOKEN_SYMBOL and text == "(":
+            # FROM (t)、JOIN (a, b)等括号中的表引用，括号内是子查询时按普通括号处理
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            is_subquery = following is not None and following[0] == TOKEN_WORD \
+                and following[1].upper() in ("SELECT", "WITH")
+            in_table_list.append(not is_subquery)
+            expect_table = not is_subquery
+        else:
+            expect_table = False
+            if kind == TOKEN_SYMBOL and text == "(":
+                in_table_list.append(False)
+            elif kind == TOKEN_SYMBOL and text == ")":
+                if len(in_table_list) > 1:
+                    in_table_list.pop()
+            elif kind == TOKEN_SYMBOL and text == ",":
+                expect_table = in_table_list[-1]
+            elif keyword in _CLAUSE_KEYWORDS or (kind == TOKEN_SYMBOL and text == ";"):
+                in_table_list[-1] = False
+        i += 1
+    return tables
+
+
+def limit_position(query: str) -> Optional[int]:
+    """查找SELECT语句中可以插入LIMIT子句的位置
+    
+    语句顶层已有LIMIT，或者包含必须位于LIMIT之后的子句（INTO、FOR UPDATE、LOCK IN SHARE MODE等）
+    以及多条语句时返回None。子查询中的LIMIT不影响判断。
+    语句以分号结束（其后只有空白或注释）时，LIMIT应插入到分号之前。
+    
+    Args:
+        query: SQL查询语句
+    
+    Returns:
+        Optional[int]: 插入位置，即末尾分号的位置或查询字符串的长度；不能追加LIMIT时返回None
+    """
+    depth = 0
+    first = True
+    terminator = None
+    for kind, text, start in _scan(query):
+        if terminator is not None:
+            # 分号之后还有其他语句
+            return None
+        if first:
+            if kind != TOKEN_WORD or text.upper() != "SELECT":
+                return None
+            first = False
+        elif kind == TOKEN_SYMBOL and text == "(":
+            depth += 1
+        elif kind == TOKEN_SYMBOL and text == ")":
+            depth -= 1
+        elif depth == 0 and kind == TOKEN_SYMBOL and text == ";":
+            terminator = start
+        elif depth == 0 and kind in (TOKEN_WORD, TOKEN_SYMBOL) and text.upper() in _NO_APPEND_LIMIT:
+            return None
+    if first:
+        return None
+    return len(query) if terminator is None else terminator
+
+
+def _quote_ident(name: str) -> str:
+    """验证并引用SQL标识符（表名、列名）
+    
+    表名和列名无法作为查询参数传递，只能拼接到SQL中，因此必须先严格验证。
+    
+    Args:
+        name: 标识符
+    
+    Returns:
+        str: 用反引号引用的标识符
+    
+    Raises:
+        ValueError: 标识符包含非法字符或超过64个字符
+    """
+    if not isinstance(name, str) or not _IDENTIFIER_RE.fullmatch(name):
+        raise ValueError(f"非法的标识符: {name!r}")
+    return f"`{name}`"
+
+
+def parse_operation(query: str) -> Optional[str]:
+    """提取SQL查询的操作类型
+    
+    Args:
+        query: SQL查询语句
+    
+    Returns:
+        Optional[str]: 大写的操作类型，无法识别时返回None
+    """
+    for kind, text in tokenize(query):
+        return text.upper() if kind == TOKEN_WORD else None
+    return None
+
+
 class SecurityManager:
     """安全管理器类"""
     
@@ -34,55 +267,67 @@ class SecurityManager:
         self.max_rows = max_rows
         self.timeout_seconds = timeout_seconds
         
+        self._allowed_ops = frozenset(op.upper() for op in self.allowed_operations)
+        
+        # 危险模式合并为一个分支表达式，只需扫描查询字符串一次
+        self._danger_re = re.compile(
+            '|'.join(f'(?:{pattern})' for pattern in DANGEROUS_PATTERNS),
+            re.IGNORECASE
+        )
+        # 表名比较不区分大小写
+        self._allowed_tables_ci = frozenset(t.casefold() for t in self.allowed_tables)
+        
         logger.info(f"安全管理器初始化: 允许的表={self.allowed_tables}, 允许的操作={self.allowed_operations}")
     
-    def validate_query(self, query: str) -> bool:
+    def validate_query(self, query: str) -> Tuple[bool, Optional[str]]:
         """验证SQL查询是否允许执行
         
         Args:
             query: SQL查询语句
         
         Returns:
-            bool: 查询是否允许执行
+            Tuple[bool, Optional[str]]: 查询是否允许执行，以及解析出的操作类型，
+                后者可以直接传给MySQLDatabase.execute_query以免重复解析
         """
         if not query.strip():
             logger.warning("空查询被拒绝")
-            return False
+            return False, None
         
-        # 提取SQL操作类型
-        operation_match = re.match(r'^\s*(\w+)', query, re.IGNORECASE)
-        if not operation_match:
-            logger.warning(f"无法识别的查询操作: {query}")
-            return False
+        tokens = list(tokenize(query))
         
-        operation = operation_match.group(1).upper()
+        # 提取SQL操作类型，注释会被跳过，不能用注释隐藏真正的操作
+        if not tokens or tokens[0][0] != TOKEN_WORD:
+            logger.warning(f"无法识别的查询操作: {query}")
+            return False, None
+        operation = tokens[0][1].upper()
         
         # 检查操作是否允许
-        if operation not in self.allowed_operations:
+        if operation not in self._allowed_ops:
             logger.warning(f"操作不被允许: {operation}")
-            return False
+            return False, operation
         
         # 如果指定了允许的表，则检查查询中的表是否允许
         if self.allowed_tables:
             # 提取查询中的表名
             # 注意：这是一个简化的实现，可能无法处理所有SQL语法
-            tables_pattern = r'\bFROM\s+`?([\w\d_]+)`?|\bJOIN\s+`?([\w\d_]+)`?|\bUPDATE\s+`?([\w\d_]+)`?|\bINTO\s+`?([\w\d_]+)`?'
-            tables_matches = re.finditer(tables_pattern, query, re.IGNORECASE)
-            
-            query_tables = []
-            for match in tables_matches:
-                # 获取匹配的组中非None的值
-                table = next((g for g in match.groups() if g is not None), None)
-                if table:
-                    query_tables.append(table.lower())
-            
             # 检查查询中的表是否都在允许列表中
-            for table in query_tables:
-                if table not in [t.lower() for t in self.allowed_tables]:
+            for table in _extract_tables(tokens):
+                if not self.is_table_allowed(table):
                     logger.warning(f"表不被允许访问: {table}")
-                    return False
+                    return False, operation
         
-        return True
+        return True, operation
+    
+    def is_table_allowed(self, name: str) -> bool:
+        """检查表是否允许访问
+        
+        Args:
+            name: 表名，不区分大小写
+        
+        Returns:
+            bool: 未指定允许的表，或者表在允许列表中时返回True
+        """
+        return not self._allowed_tables_ci or name.casefold() in self._allowed_tables_ci
     
     def is_dangerous_query(self, query: str) -> bool:
         """检查查询是否包含危险操作
@@ -94,21 +339,9 @@ class SecurityManager:
             bool: 查询是否包含危险操作
         """
         # 检查是否包含DROP, TRUNCATE, DELETE等危险操作
-        dangerous_patterns = [
-            r'\bDROP\b',
-            r'\bTRUNCATE\b',
-            r'\bDELETE\b\s+(?!WHERE)',  # DELETE没有WHERE条件
-            r'\bUPDATE\b\s+(?!WHERE)',  # UPDATE没有WHERE条件
-            r'--',  # SQL注释
-            r';\s*\w',  # 多条语句
-            r'\bEXEC\b',
-            r'\bXP_\w',
-            r'\bSYSTEM\b'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, query, re.IGNORECASE):
-                logger.warning(f"检测到危险查询模式: {pattern}")
-                return True
+        match = self._danger_re.search(query)
+        if match:
+            logger.warning(f"检测到危险查询模式: {match.group(0)!r}")
+            return True
         
         return False
\ No newline at end of file
@@ -9,9 +9,10 @@ MCP工具定义模块
 - 获取数据库模式工具
 - 获取表结构工具
 - 分析数据工具
+- 分页查询工具
 """
 
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Union
 
 from loguru import logger
 from python_mcp import ToolRegistry
@@ -19,15 +20,21 @@ from python_mcp import ToolRegistry
 # 使用python_mcp模块中的工具注册功能
 
 from mysql_mcp.database import MySQLDatabase
-from mysql_mcp.security import SecurityManager
+from mysql_mcp.schema import SchemaManager
+from mysql_mcp.security import SecurityManager, _quote_ident
 
+# 日志中记录的查询语句最大长度
+QUERY_LOG_LIMIT = 256
 
-def register_tools(database: MySQLDatabase, security: SecurityManager) -> ToolRegistry:
+
+def register_tools(database: MySQLDatabase, security: SecurityManager,
+                   schema_manager: Optional[SchemaManager] = None) -> ToolRegistry:
     """注册MCP工具
     
     Args:
         database: MySQL数据库连接
         security: 安全管理器
+        schema_manager: 模式管理器，用于缓存模式查询结果，为None时不缓存
     
     Returns:
         ToolRegistry: MCP工具注册表
@@ -45,10 +52,12 @@ def register_tools(database: MySQLDatabase, security: SecurityManager) -> ToolRe
         Returns:
             Dict[str, Any]: 查询结果
         """
-        logger.info(f"执行SQL查询: {query}")
+        # 延迟格式化，日志级别不输出INFO时不会截取和格式化查询语句
+        logger.opt(lazy=True).info("执行SQL查询: {}", lambda: query[:QUERY_LOG_LIMIT])
         
         # 验证查询
-        if not security.validate_query(query):
+        allowed, operation = security.validate_query(query)
+        if not allowed:
             return {"success": False, "error": "查询操作不被允许"}
         
         # 检查危险查询
@@ -56,7 +65,60 @@ def register_tools(database: MySQLDatabase, security: SecurityManager) -> ToolRe
             return {"success": False, "error": "查询包含危险操作"}
         
         # 执行查询
-        return database.execute_query(query, security.max_rows)
+        return database.execute_query(query, security.max_rows, op=operation)
+    
+    # 分页查询工具
+    @registry.tool("paginated_query")
+    def paginated_query(query: str = "", page_size: int = 100, cursor_id: Optional[str] = None) -> Dict[str, Any]:
+        """分页执行SQL查询
+        
+        首次调用传入query，服务器执行查询并保留游标；后续调用只需传入返回的cursor_id
+        即可读取下一页，直到has_more为False。
+        
+        Args:
+            query: SQL查询语句，仅首次调用需要
+            page_size: 每页行数，不超过最大返回行数
+            cursor_id: 上一次调用返回的游标ID
+        
+        Returns:
+            Dict[str, Any]: 当前页的查询结果
+        """
+        page_size = max(1, min(page_size, security.max_rows))
+        
+        if cursor_id is None:
+            logger.opt(lazy=True).info("打开分页查询: {}", lambda: query[:QUERY_LOG_LIMIT])
+            
+            # 验证查询
+            allowed, _ = security.validate_query(query)
+            if not allowed:
+                return {"success": False, "error": "查询操作不被允许"}
+            
+            # 检查危险查询
+            if security.is_dangerous_query(query):
+                return {"success": False, "error": "查询包含危险操作"}
+            
+            try:
+                cursor_id = database.open_cursor(query)
+            except Exception as e:
+                logger.error(f"打开分页查询失败: {e}")
+                return {"success": False, "error": str(e)}
+        
+        try:
+            rows, exhausted = database.fetch_cursor(cursor_id, page_size)
+        except KeyError:
+            return {"success": False, "error": f"游标 {cursor_id} 不存在或已过期"}
+        except Exception as e:
+            logger.error(f"读取分页查询失败: {e}")
+            database.close_cursor(cursor_id)
+            return {"success": False, "error": str(e)}
+        
+        return {
+            "success": True,
+            "cursor_id": None if exhausted else cursor_id,
+            "rows": rows,
+            "row_count": len(rows),
+            "has_more": not exhausted
+        }
     
     # 获取数据库模式工具
     @registry.tool("get_schema")
@@ -67,13 +129,21 @@ def register_tools(database: MySQLDatabase, security: SecurityManager) -> ToolRe
             Dict[str, Any]: 数据库模式信息
         """
         logger.info("获取数据库模式信息")
-        return database.get_schema(security.allowed_tables)
+        
+        def fetch() -> Dict[str, Any]:
+            return database.get_schema(security.allowed_tables)
+        
+        if schema_manager is None:
+            return fetch()
+        return schema_manager.get_or_refresh(database, "schema", fetch)
     
     # 获取表结构工具
     @registry.tool("get_table_structure")
     def get_table_structure(table_name: str) -> Dict[str, Any]:
         """获取表结构
         
+        不使用模式缓存：DESCRIBE与校验缓存所需的模式版本查询一样只需一次往返，缓存没有收益。
+        
         Args:
             table_name: 表名
         
@@ -83,46 +153,84 @@ def register_tools(database: MySQLDatabase, security: SecurityManager) -> ToolRe
         logger.info(f"获取表结构: {table_name}")
         
         # 检查表是否允许访问
-        if security.allowed_tables and table_name not in security.allowed_tables:
+        if not security.is_table_allowed(table_name):
             return {"success": False, "error": f"表 {table_name} 不被允许访问"}
         
         # 获取表结构
-        query = f"DESCRIBE `{table_name}`"
+        try:
+            query = f"DESCRIBE {_quote_ident(table_name)}"
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        
         return database.execute_query(query)
     
     # 分析数据工具
     @registry.tool("analyze_data")
-    def analyze_data(table_name: str, column_name: Optional[str] = None) -> Dict[str, Any]:
+    def analyze_data(table_name: str, column_names: Optional[Union[str, List[str]]] = None) -> Dict[str, Any]:
         """分析表数据
         
+        所有列的统计值在同一条查询中计算，只需扫描一次表。
+        
         Args:
             table_name: 表名
-            column_name: 列名，如果为空则分析整个表
+            column_names: 列名列表，也可以是单个列名，如果为空则分析整个表
         
         Returns:
-            Dict[str, Any]: 分析结果
+            Dict[str, Any]: 分析结果，指定列时按列名返回各列的统计值
         """
-        logger.info(f"分析数据: 表={table_name}, 列={column_name}")
+        logger.info(f"分析数据: 表={table_name}, 列={column_names}")
         
         # 检查表是否允许访问
-        if security.allowed_tables and table_name not in security.allowed_tables:
+        if not security.is_table_allowed(table_name):
             return {"success": False, "error": f"表 {table_name} 不被允许访问"}
         
-        # 构建分析查询
-        if column_name:
-            query = f"""
-            SELECT 
-                COUNT(*) as total_rows,
-                COUNT(DISTINCT `{column_name}`) as unique_values,
-                MIN(`{column_name}`) as min_value,
-                MAX(`{column_name}`) as max_value,
-                AVG(`{column_name}`) as avg_value
-            FROM `{table_name}`
-            """
-        else:
-            query = f"SELECT COUNT(*) as total_rows FROM `{table_name}`"
+        if isinstance(column_names, str):
+            column_names = [column_names]
+        # 去掉重复的列名并保持顺序
+        column_names = list(dict.fromkeys(column_names or ()))
         
-        return database.execute_query(query)
+        # 验证表名和列名
+        try:
+            table = _quote_ident(table_name)
+            columns = [_quote_ident(name) for name in column_names]
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        
+        if not columns:
+            return database.execute_query(f"SELECT COUNT(*) as total_rows FROM {table}")
+        
+        # 构建分析查询，每列依次计算唯一值数量、最小值、最大值和平均值
+        aggregates = ["COUNT(*)"]
+        for column in columns:
+            aggregates.extend((
+                f"COUNT(DISTINCT {column})",
+                f"MIN({column})",
+                f"MAX({column})",
+                f"AVG({column})"
+            ))
+        query = f"SELECT {', '.join(aggregates)} FROM {table}"
+        
+        result = database.execute_query(query, as_dict=False)
+        if not result.get("success"):
+            return result
+        
+        row = result["rows"][0]
+        stats = {}
+        for i, name in enumerate(column_names):
+            unique_values, min_value, max_value, avg_value = row[1 + 4 * i:5 + 4 * i]
+            stats[name] = {
+                "unique_values": unique_values,
+                "min_value": min_value,
+                "max_value": max_value,
+                "avg_value": avg_value
+            }
+        
+        return {
+            "success": True,
+            "total_rows": row[0],
+            "columns": stats,
+            "execution_time": result["execution_time"]
+        }
     
     # 获取表关系工具
     @registry.tool("get_table_relations")
@@ -22,7 +22,6 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 # 导入MySQL MCP模块
 from mysql_mcp.database import MySQLDatabase
-from mysql_mcp.schema import SchemaManager
 from server import app, init_database, init_security, setup_logging
 
 
@@ -69,25 +68,16 @@ def main():
     setup_logging(config)
     logger.info("MySQL MCP Server 正在启动...")
     
-    # 初始化数据库连接
+    # 检查数据库连接，服务器进程会自行建立连接池，这里只用于尽早发现配置错误
+    # 数据库模式由服务器按需加载，不在启动时同步加载
     try:
         database = init_database(config)
-        logger.info("数据库连接初始化成功")
+        database.close()
+        logger.info("数据库连接检查成功")
     except Exception as e:
         logger.error(f"数据库连接初始化失败: {e}")
         sys.exit(1)
     
-    # 初始化模式管理器
-    schema_manager = SchemaManager(config["database"]["database"])
-    
-    # 获取数据库模式并更新模式管理器
-    try:
-        schema_data = database.get_schema()
-        schema_manager.update_schema(schema_data)
-        logger.info(f"已加载数据库模式，共 {len(schema_data['tables'])} 个表")
-    except Exception as e:
-        logger.error(f"加载数据库模式失败: {e}")
-    
     # 初始化安全管理器
     security = init_security(config)
     
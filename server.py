@@ -11,32 +11,83 @@ MySQL MCP Server - 主服务器入口
 - 启动HTTP服务器
 """
 
+import asyncio
+import datetime
+import decimal
 import json
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional
 
+import orjson
 import uvicorn
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
+from mysql.connector import Error as MySQLError
 from pydantic import BaseModel
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent))
 
 # 导入MySQL MCP模块
-from mysql_mcp.database import MySQLDatabase
-from mysql_mcp.tools import register_tools
+from mysql_mcp.database import READ_OPS, MySQLDatabase, QueryStream
+from mysql_mcp.schema import SchemaManager
+from mysql_mcp.tools import QUERY_LOG_LIMIT, register_tools
 from mysql_mcp.security import SecurityManager
 
+
+# orjson能序列化的整数范围
+_INT64_MIN = -(1 << 63)
+_UINT64_MAX = (1 << 64) - 1
+
+
+def _json_default(obj: Any) -> Any:
+    """序列化orjson不支持的MySQL结果类型"""
+    if isinstance(obj, decimal.Decimal):
+        if obj.as_tuple().exponent >= 0:
+            # orjson只支持64位整数，超出范围的整数以字符串输出，避免丢失精度
+            value = int(obj)
+            return value if _INT64_MIN <= value <= _UINT64_MAX else str(value)
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", errors="replace")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+
+
+def _dumps(obj: Any) -> bytes:
+    """使用orjson序列化为JSON字节串"""
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MCPJSONResponse(JSONResponse):
+    """使用orjson序列化的JSON响应"""
+    
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
+
+
 # 创建FastAPI应用
-app = FastAPI(title="MySQL MCP Server", description="Trae AI的MySQL数据库集成服务器")
+app = FastAPI(
+    title="MySQL MCP Server",
+    description="Trae AI的MySQL数据库集成服务器",
+    default_response_class=MCPJSONResponse
+)
 
 # 全局变量
 config: Dict[str, Any] = {}
 database: Optional[MySQLDatabase] = None
 security: Optional[SecurityManager] = None
+schema_manager: Optional[SchemaManager] = None
+# 同时进行的流式响应数，每个流式响应在客户端读完前一直占用一个连接
+stream_slots: Optional[asyncio.Semaphore] = None
 
 
 class MCPRequest(BaseModel):
@@ -76,12 +127,16 @@ def setup_logging(config: Dict[str, Any]) -> None:
 def init_database(config: Dict[str, Any]) -> MySQLDatabase:
     """初始化数据库连接"""
     db_config = config.get("database", {})
+    security_config = config.get("security", {})
     return MySQLDatabase(
         host=db_config.get("host", "localhost"),
         port=db_config.get("port", 3306),
         user=db_config.get("user", "root"),
         password=db_config.get("password", ""),
-        database=db_config.get("database", "test")
+        database=db_config.get("database", "test"),
+        pool_size=db_config.get("pool_size", 8),
+        max_cursors=db_config.get("max_cursors", 16),
+        cursor_timeout=security_config.get("timeout_seconds", 30)
     )
 
 
@@ -96,10 +151,27 @@ def init_security(config: Dict[str, Any]) -> SecurityManager:
     )
 
 
+def max_streams(config: Dict[str, Any], pool_size: int) -> int:
+    """同时进行的流式响应数上限，始终小于连接池大小，剩余的连接数即线程池的线程数"""
+    limit = config.get("database", {}).get("max_streams", pool_size // 2)
+    return max(1, min(limit, pool_size - 1))
+
+
+def init_schema_manager(config: Dict[str, Any], database: MySQLDatabase) -> SchemaManager:
+    """初始化模式管理器"""
+    db_config = config.get("database", {})
+    schema_config = config.get("schema", {})
+    return SchemaManager(
+        db_config.get("database", "test"),
+        cache_enabled=not schema_config.get("disable_schema_cache", False),
+        database=database
+    )
+
+
 @app.on_event("startup")
 async def startup_event():
     """服务器启动事件"""
-    global config, database, security
+    global config, database, security, schema_manager, stream_slots
     
     # 加载配置
     config = load_config()
@@ -116,13 +188,33 @@ async def startup_event():
         logger.error(f"数据库连接初始化失败: {e}")
         raise
     
+    # 数据库操作在线程池中执行。流式响应在等待客户端读取时占用连接而不占用线程，
+    # 而连接池没有空闲连接时会直接报错，因此线程数为连接池大小减去流式响应数上限，
+    # 超出的请求在线程池中排队，而不是因连接池耗尽而失败
+    stream_limit = max_streams(config, database.pool_size)
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=database.pool_size - stream_limit, thread_name_prefix="mcp-db")
+    )
+    stream_slots = asyncio.Semaphore(stream_limit)
+    
     # 初始化安全管理器
     security = init_security(config)
     logger.info("安全管理器初始化成功")
     
+    # 初始化模式管理器，模式信息按需加载，并在后台线程中预加载，不阻塞服务器启动
+    schema_manager = init_schema_manager(config, database)
+    schema_config = config.get("schema", {})
+    if schema_config.get("prewarm", True):
+        threading.Thread(
+            target=schema_manager.prewarm,
+            args=(security.allowed_tables, schema_config.get("prewarm_jitter_seconds", 60)),
+            name="mcp-schema-prewarm",
+            daemon=True
+        ).start()
+    
     # 注册MCP工具
     try:
-        tool_registry = register_tools(database, security)
+        tool_registry = register_tools(database, security, schema_manager)
         logger.info(f"已成功注册 {len(tool_registry.tools)} 个MCP工具")
     except Exception as e:
         logger.error(f"注册MCP工具失败: {e}")
@@ -146,25 +238,108 @@ async def shutdown_event():
     logger.info("MySQL MCP Server 已关闭")
 
 
-@app.post("/mcp")
-async def handle_mcp_request(request: MCPRequest) -> MCPResponse:
-    """处理MCP请求"""
+async def stream_mcp_result(stream: QueryStream) -> AsyncIterator[bytes]:
+    """把流式查询结果逐块编码为MCP响应
+    
+    响应结构与execute_query的结果一致，只是rows在success、row_count等读完后才能确定的字段之前输出。
+    读取过程中出错时结果行可能不完整，success为false，错误信息放在响应的error字段中。
+    
+    Args:
+        stream: 已执行的流式查询
+    """
+    error = None
+    try:
+        yield b'{"result":{"columns":' + _dumps(stream.columns) + b',"rows":['
+        first = True
+        try:
+            # 每块结果在线程池中读取，避免阻塞事件循环
+            while True:
+                chunk = await asyncio.to_thread(stream.fetch)
+                if not chunk:
+                    break
+                # 整块序列化后去掉首尾的方括号，拼接到同一个数组中
+                data = _dumps(chunk)[1:-1]
+                yield data if first else b"," + data
+                first = False
+        except Exception as e:
+            logger.error(f"流式读取查询结果失败: {e}")
+            error = str(e)
+        yield (b'],"success":' + _dumps(error is None)
+               + b',"row_count":' + _dumps(stream.row_count)
+               + b',"has_more":' + _dumps(stream.has_more)
+               + b',"execution_time":' + _dumps(stream.execution_time)
+               + b'},"error":' + _dumps(error) + b'}')
+    finally:
+        # 客户端提前断开时也要归还连接
+        await asyncio.to_thread(stream.close)
+
+
+async def stream_mcp_query(query: str, operation: str) -> AsyncIterator[bytes]:
+    """执行返回结果集的查询并输出MCP响应
+    
+    流式响应名额和连接在响应开始迭代后才获取，客户端在响应开始前断开时不会占用任何资源。
+    流式响应数达到上限时改为一次读完结果再返回，不会因为读取较慢的客户端占满连接池。
+    
+    Args:
+        query: 已通过验证的SQL查询语句
+        operation: 查询的操作类型
+    """
+    if stream_slots.locked():
+        result = await asyncio.to_thread(database.execute_query, query, security.max_rows, op=operation)
+        yield _dumps({"result": result, "error": None})
+        return
+    
+    async with stream_slots:
+        try:
+            stream = await asyncio.to_thread(database.stream_query, query, security.max_rows, op=operation)
+        except MySQLError as e:
+            # 与execute_query的查询失败结果一致，响应结构不取决于是否有空闲的流式响应名额
+            logger.error(f"执行查询失败: {e}")
+            yield _dumps({"result": {"success": False, "error": str(e)}, "error": None})
+            return
+        except Exception as e:
+            logger.error(f"处理MCP请求失败: {e}")
+            yield _dumps({"result": None, "error": str(e)})
+            return
+        
+        # 响应结束或被丢弃时立即关闭内层生成器，归还连接后才释放名额
+        parts = stream_mcp_result(stream)
+        try:
+            async for part in parts:
+                yield part
+        finally:
+            await parts.aclose()
+
+
+@app.post("/mcp", response_model=MCPResponse)
+async def handle_mcp_request(request: MCPRequest) -> Response:
+    """处理MCP请求
+    
+    查询结果直接由orjson序列化返回，不再经过Pydantic模型校验和jsonable_encoder逐行转换。
+    返回结果集的查询以流式响应输出，服务器内存只与每次读取的块大小有关。
+    """
     global database, security
     
-    logger.info(f"收到MCP请求: {request.query}")
+    logger.opt(lazy=True).debug("收到MCP请求: {}", lambda: request.query[:QUERY_LOG_LIMIT])
     
     try:
         # 验证请求
-        if not security.validate_query(request.query):
-            return MCPResponse(result=None, error="查询操作不被允许")
+        allowed, operation = security.validate_query(request.query)
+        if not allowed:
+            return MCPJSONResponse({"result": None, "error": "查询操作不被允许"})
+        
+        # 执行查询，阻塞的数据库操作放到线程池中，避免阻塞事件循环
+        if operation in READ_OPS:
+            return StreamingResponse(stream_mcp_query(request.query, operation), media_type="application/json")
         
-        # 执行查询
-        result = database.execute_query(request.query, security.max_rows)
+        result = await asyncio.to_thread(
+            database.execute_query, request.query, security.max_rows, op=operation
+        )
         
-        return MCPResponse(result=result)
+        return MCPJSONResponse({"result": result, "error": None})
     except Exception as e:
         logger.error(f"处理MCP请求失败: {e}")
-        return MCPResponse(result=None, error=str(e))
+        return MCPJSONResponse({"result": None, "error": str(e)})
 
 
 @app.get("/health")
@@ -174,7 +349,7 @@ async def health_check():
     
     try:
         # 检查数据库连接
-        if database and database.is_connected():
+        if database and await asyncio.to_thread(database.ping):
             return {"status": "healthy", "database": "connected"}
         else:
             return {"status": "unhealthy", "database": "disconnected"}
@@ -186,11 +361,14 @@ async def health_check():
 @app.get("/schema")
 async def get_schema():
     """获取数据库模式"""
-    global database, security
+    global database, security, schema_manager
     
     try:
         # 获取数据库模式
-        schema = database.get_schema(security.allowed_tables)
+        schema = await asyncio.to_thread(
+            schema_manager.get_or_refresh,
+            database, "schema", lambda: database.get_schema(security.allowed_tables)
+        )
         return {"schema": schema}
     except Exception as e:
         logger.error(f"获取数据库模式失败: {e}")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试夹具
+
+这个模块提供各测试模块共用的pytest夹具。
+"""
+
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def database_class():
+    """MySQLDatabase类
+    
+    在夹具中才导入数据库模块，单独运行test_security.py等不需要数据库的测试模块时不会加载mysql.connector。
+    """
+    from mysql_mcp.database import MySQLDatabase
+    return MySQLDatabase
+
+
+@pytest.fixture(scope="module")
+def db_mock(database_class):
+    """模块内共用的数据库实例及其模拟连接，连接池被替换为模拟对象"""
+    with patch('mysql.connector.pooling.MySQLConnectionPool'):
+        database = database_class(
+            host="localhost",
+            port=3306,
+            user="test_user",
+            password="test_password",
+            database="test_db"
+        )
+        yield database, MagicMock()
+
+
+@pytest.fixture
+def mock_connection(db_mock):
+    """从模拟连接池取出的连接，清除上一个测试留下的调用记录和返回值"""
+    database, connection = db_mock
+    database.pool.reset_mock(return_value=True, side_effect=True)
+    connection.reset_mock(return_value=True, side_effect=True)
+    database.pool.get_connection.return_value = connection
+    return connection
+
+
+@pytest.fixture
+def db(db_mock, mock_connection):
+    """共用的数据库实例，测试结束后恢复被修改的连接池"""
+    database, _ = db_mock
+    pool = database.pool
+    yield database
+    database.pool = pool
\ No newline at end of file
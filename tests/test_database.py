@@ -7,147 +7,324 @@
 这个模块测试MySQL数据库连接和操作功能。
 """
 
-import unittest
-from unittest.mock import patch, MagicMock
-
-from mysql_mcp.database import MySQLDatabase
-
-
-class TestMySQLDatabase(unittest.TestCase):
-    """测试MySQLDatabase类"""
-    
-    @patch('mysql.connector.connect')
-    def setUp(self, mock_connect):
-        """测试前准备"""
-        # 模拟数据库连接
-        self.mock_connection = MagicMock()
-        mock_connect.return_value = self.mock_connection
-        
-        # 创建数据库实例
-        self.db = MySQLDatabase(
-            host="localhost",
-            port=3306,
-            user="test_user",
-            password="test_password",
-            database="test_db"
-        )
-    
-    def test_is_connected(self):
-        """测试连接状态检查"""
-        # 设置连接状态
-        self.mock_connection.is_connected.return_value = True
-        self.assertTrue(self.db.is_connected())
-        
-        self.mock_connection.is_connected.return_value = False
-        self.assertFalse(self.db.is_connected())
-    
-    def test_reconnect_if_needed(self):
-        """测试重新连接功能"""
-        # 设置连接断开
-        self.mock_connection.is_connected.return_value = False
-        
-        # 调用重连方法
-        with patch.object(self.db, 'connect') as mock_connect:
-            self.db.reconnect_if_needed()
-            mock_connect.assert_called_once()
-    
-    def test_execute_select_query(self):
-        """测试执行SELECT查询"""
-        # 模拟游标
-        mock_cursor = MagicMock()
-        self.mock_connection.cursor.return_value = mock_cursor
-        
-        # 设置查询结果
-        mock_cursor.description = [("id",), ("name",)]
-        mock_cursor.fetchmany.return_value = [{"id": 1, "name": "测试"}]
-        mock_cursor.fetchone.return_value = None
-        
-        # 执行查询
-        result = self.db.execute_query("SELECT * FROM test_table")
-        
-        # 验证结果
-        self.assertTrue(result["success"])
-        self.assertEqual(result["rows"], [{"id": 1, "name": "测试"}])
-        self.assertEqual(result["row_count"], 1)
-        self.assertFalse(result["has_more"])
-        self.assertEqual(result["columns"], ["id", "name"])
-    
-    def test_execute_update_query(self):
-        """测试执行UPDATE查询"""
-        # 模拟游标
-        mock_cursor = MagicMock()
-        self.mock_connection.cursor.return_value = mock_cursor
-        
-        # 设置影响行数
-        mock_cursor.rowcount = 2
-        
-        # 执行查询
-        result = self.db.execute_query("UPDATE test_table SET name = '新名称' WHERE id = 1")
-        
-        # 验证结果
-        self.assertTrue(result["success"])
-        self.assertEqual(result["affected_rows"], 2)
-        
-        # 验证提交事务
-        self.mock_connection.commit.assert_called_once()
-    
-    def test_execute_query_error(self):
-        """测试查询错误处理"""
-        # 模拟游标
-        mock_cursor = MagicMock()
-        self.mock_connection.cursor.return_value = mock_cursor
-        
-        # 设置查询异常
-        mock_cursor.execute.side_effect = Exception("测试错误")
-        
-        # 执行查询
-        result = self.db.execute_query("SELECT * FROM test_table")
-        
-        # 验证结果
-        self.assertFalse(result["success"])
-        self.assertEqual(result["error"], "测试错误")
-    
-    def test_get_schema(self):
-        """测试获取数据库模式"""
-        # 模拟execute_query方法
-        with patch.object(self.db, 'execute_query') as mock_execute:
-            # 设置表查询结果
-            mock_execute.side_effect = [
-                # SHOW TABLES 结果
-                {
-                    "success": True,
-                    "rows": [{"Tables_in_test_db": "test_table"}]
-                },
-                # DESCRIBE test_table 结果
-                {
-                    "success": True,
-                    "rows": [
-                        {"Field": "id", "Type": "int", "Null": "NO", "Key": "PRI", "Default": None, "Extra": "auto_increment"},
-                        {"Field": "name", "Type": "varchar(255)", "Null": "YES", "Key": "", "Default": None, "Extra": ""}
-                    ]
-                }
+import sys
+from unittest.mock import call, patch, MagicMock
+
+import pytest
+from mysql.connector.errors import DatabaseError, OperationalError, PoolError
+
+# 多次比较的中文测试数据，驻留后相等比较可以直接比较对象
+_ZH_TEST = sys.intern("测试")
+_ZH_ERROR = sys.intern("测试错误")
+
+# INFORMATION_SCHEMA.COLUMNS查询结果，使用元组，所有测试共用且不会被修改
+_COLUMN_ROWS = (
+    ("test_table", "id", "int", "NO", "PRI", None, "auto_increment"),
+    ("test_table", "name", "varchar(255)", "YES", "", None, ""),
+    ("other_table", "id", "int", "NO", "PRI", None, "")
+)
+
+# 由_COLUMN_ROWS生成的数据库模式
+_EXPECTED_SCHEMA = {
+    "database": "test_db",
+    "tables": [
+        {
+            "name": "test_table",
+            "columns": [
+                {"name": "id", "type": "int", "nullable": False, "key": "PRI", "default": None,
+                 "extra": "auto_increment"},
+                {"name": "name", "type": "varchar(255)", "nullable": True, "key": "", "default": None, "extra": ""}
+            ]
+        },
+        {
+            "name": "other_table",
+            "columns": [
+                {"name": "id", "type": "int", "nullable": False, "key": "PRI", "default": None, "extra": ""}
             ]
-            
-            # 获取模式
-            schema = self.db.get_schema()
-            
-            # 验证结果
-            self.assertEqual(schema["database"], "test_db")
-            self.assertEqual(len(schema["tables"]), 1)
-            self.assertEqual(schema["tables"][0]["name"], "test_table")
-            self.assertEqual(len(schema["tables"][0]["columns"]), 2)
-    
-    def test_close(self):
-        """测试关闭连接"""
-        # 设置连接状态
-        self.mock_connection.is_connected.return_value = True
-        
-        # 关闭连接
-        self.db.close()
-        
-        # 验证连接关闭
-        self.mock_connection.close.assert_called_once()
+        }
+    ]
+}
+
+
+def test_ping(db, mock_connection):
+    """测试连接状态检查"""
+    assert db.ping()
+    assert mock_connection.ping.call_args_list == [call(reconnect=True)]
+    
+    # 连接归还到连接池
+    assert mock_connection.close.call_count == 1
+    
+    # 模拟连接池无法提供可用连接
+    db.pool.get_connection.side_effect = PoolError("pool exhausted")
+    assert not db.ping()
+
+
+def test_execute_select_query(db, mock_connection):
+    """测试执行SELECT查询"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    
+    # 设置查询结果
+    mock_cursor.description = [("id",), ("name",)]
+    mock_cursor.fetchmany.return_value = [{"id": 1, "name": _ZH_TEST}]
+    
+    # 执行查询
+    result = db.execute_query("SELECT * FROM test_table")
+    
+    # 验证结果
+    assert result["success"]
+    assert result["rows"] == [{"id": 1, "name": _ZH_TEST}]
+    assert result["row_count"] == 1
+    assert not result["has_more"]
+    assert result["columns"] == ["id", "name"]
+    
+    # 验证使用非缓冲游标
+    assert mock_connection.cursor.call_args_list == [call(dictionary=True, buffered=False)]
+
+
+def test_execute_select_query_has_more(db, mock_connection):
+    """测试结果超过最大行数时的截断和剩余结果释放"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    
+    # 设置查询结果：前两行加一行探测行，以及剩余的一块结果
+    mock_cursor.description = [("id",)]
+    mock_cursor.fetchmany.side_effect = [[{"id": 1}, {"id": 2}, {"id": 3}], [{"id": 4}]]
+    
+    # 执行查询
+    result = db.execute_query("SELECT * FROM test_table", max_rows=2)
+    
+    # 验证结果
+    assert result["success"]
+    assert result["rows"] == [{"id": 1}, {"id": 2}]
+    assert result["has_more"]
+    
+    # 验证一次读取max_rows + 1行，且剩余结果被读完后才关闭游标
+    assert mock_cursor.fetchmany.call_args_list[0][0] == (3,)
+    assert mock_cursor.fetchmany.call_count == 2
+    assert mock_cursor.fetchone.call_count == 0
+    assert mock_cursor.close.call_count == 1
+
+
+def test_execute_select_query_limit_pushdown(db, mock_connection):
+    """测试为没有LIMIT的SELECT语句追加LIMIT"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    mock_cursor.fetchmany.return_value = []
+    
+    # 没有LIMIT的查询追加max_rows + 1
+    db.execute_query("SELECT * FROM test_table ORDER BY id", max_rows=10)
+    assert mock_cursor.execute.call_args == call("SELECT * FROM test_table ORDER BY id\nLIMIT 11")
+    
+    # 末尾的分号保留在LIMIT之后
+    db.execute_query("SELECT * FROM test_table; -- 结束", max_rows=10)
+    assert mock_cursor.execute.call_args == call("SELECT * FROM test_table\nLIMIT 11; -- 结束")
+    
+    # 已有LIMIT的查询保持不变
+    db.execute_query("SELECT * FROM test_table LIMIT 5", max_rows=10)
+    assert mock_cursor.execute.call_args == call("SELECT * FROM test_table LIMIT 5")
+
+
+def test_execute_query_as_tuples(db, mock_connection):
+    """测试以元组形式返回结果行"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    mock_cursor.description = [("Tables_in_test_db",)]
+    mock_cursor.fetchmany.return_value = [("test_table",)]
+    
+    # 执行查询
+    result = db.execute_query("SHOW TABLES", as_dict=False)
+    
+    # 验证结果
+    assert result["rows"] == [("test_table",)]
+    assert mock_connection.cursor.call_args_list == [call(dictionary=False, buffered=False)]
+
+
+def test_execute_update_query(db, mock_connection):
+    """测试执行UPDATE查询"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    
+    # 设置影响行数，语句不返回结果集
+    mock_cursor.with_rows = False
+    mock_cursor.rowcount = 2
+    
+    # 执行查询
+    result = db.execute_query("UPDATE test_table SET name = '新名称' WHERE id = 1")
+    
+    # 验证结果
+    assert result["success"]
+    assert result["affected_rows"] == 2
+    
+    # 验证提交事务并归还连接
+    assert mock_connection.commit.call_count == 1
+    assert mock_connection.close.call_count == 1
+
+
+def test_execute_call_with_rows(db, mock_connection):
+    """测试返回结果行的非查询语句"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    mock_cursor.with_rows = True
+    mock_cursor.description = [("id",)]
+    mock_cursor.fetchmany.return_value = [{"id": 1}]
+    
+    # 执行存储过程
+    result = db.execute_query("CALL list_users()")
+    
+    # 验证读取了结果行，并提交事务
+    assert result["rows"] == [{"id": 1}]
+    assert "affected_rows" not in result
+    assert mock_connection.commit.call_count == 1
+
+
+def test_execute_query_error(db, mock_connection):
+    """测试查询错误处理"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    
+    # 设置查询异常，execute_query只处理MySQL驱动的异常
+    mock_cursor.execute.side_effect = DatabaseError(_ZH_ERROR)
+    
+    # 执行查询
+    result = db.execute_query("SELECT * FROM test_table")
+    
+    # 验证结果
+    assert not result["success"]
+    assert result["error"] == _ZH_ERROR
+
+
+def test_stream_query(db, mock_connection):
+    """测试流式读取查询结果"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    mock_cursor.description = [("id",)]
+    mock_cursor.fetchmany.side_effect = [[{"id": 1}, {"id": 2}], [{"id": 3}], []]
+    
+    # 执行查询
+    stream = db.stream_query("SELECT id FROM test_table", max_rows=2, chunk_size=2)
+    assert stream.columns == ["id"]
+    assert mock_cursor.execute.call_args_list == [call("SELECT id FROM test_table\nLIMIT 3")]
+    
+    # 逐块读取，超出max_rows的探测行不返回
+    assert stream.fetch() == [{"id": 1}, {"id": 2}]
+    assert mock_connection.close.call_count == 0
+    assert stream.fetch() == []
+    
+    # 验证读完后归还连接
+    assert stream.row_count == 2
+    assert stream.has_more
+    assert mock_connection.close.call_count == 1
+    stream.close()
+    assert mock_connection.close.call_count == 1
+
+
+def test_stream_query_fetch_error(db, mock_connection):
+    """测试读取失败后不再读取剩余结果，释放时不抛出异常"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    mock_cursor.description = [("id",)]
+    mock_cursor.fetchmany.side_effect = [[{"id": 1}], OperationalError("连接中断")]
+    mock_cursor.close.side_effect = OperationalError("连接中断")
+    
+    stream = db.stream_query("SELECT id FROM test_table", max_rows=10, chunk_size=1)
+    assert stream.fetch() == [{"id": 1}]
+    with pytest.raises(OperationalError):
+        stream.fetch()
+    
+    # 验证没有再读取剩余结果，连接已归还
+    assert mock_cursor.fetchmany.call_count == 2
+    assert mock_connection.close.call_count == 1
+    stream.close()
+    assert stream.fetch() == []
+    assert mock_connection.close.call_count == 1
+
+
+def test_get_schema(db, mock_connection):
+    """测试获取数据库模式"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    
+    # 设置INFORMATION_SCHEMA.COLUMNS查询结果
+    mock_cursor.fetchall.return_value = _COLUMN_ROWS
+    
+    # 获取模式
+    schema = db.get_schema()
+    
+    # 验证结果
+    assert schema == _EXPECTED_SCHEMA
+    
+    # 验证只执行了一次查询
+    assert mock_cursor.execute.call_count == 1
+    assert mock_cursor.execute.call_args[0][1] == ("test_db",)
+
+
+def test_get_schema_allowed_tables(db, mock_connection):
+    """测试按允许的表过滤数据库模式"""
+    # 模拟游标
+    mock_cursor = MagicMock()
+    mock_connection.cursor.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = []
+    
+    # 获取模式
+    db.get_schema(["users", "products"])
+    
+    # 验证表名以参数形式传入
+    query, params = mock_cursor.execute.call_args[0]
+    assert "TABLE_NAME IN (%s, %s)" in query
+    assert params == ("test_db", "users", "products")
+
+
+def test_paginated_cursor(db):
+    """测试分页游标的打开、读取和关闭"""
+    # 模拟分页游标使用的独立连接
+    cursor_connection = MagicMock()
+    mock_cursor = MagicMock()
+    cursor_connection.cursor.return_value = mock_cursor
+    mock_cursor.description = [("id",)]
+    mock_cursor.fetchmany.side_effect = [[{"id": 1}, {"id": 2}], [{"id": 3}]]
+    
+    with patch('mysql.connector.connect', return_value=cursor_connection):
+        cursor_id = db.open_cursor("SELECT id FROM test_table")
+    
+    assert mock_cursor.execute.call_args_list == [call("SELECT id FROM test_table")]
+    
+    # 第一页读满，游标保持打开
+    rows, exhausted = db.fetch_cursor(cursor_id, 2)
+    assert rows == [{"id": 1}, {"id": 2}]
+    assert not exhausted
+    
+    # 最后一页不足一页，游标自动关闭
+    rows, exhausted = db.fetch_cursor(cursor_id, 2)
+    assert rows == [{"id": 3}]
+    assert exhausted
+    assert cursor_connection.close.call_count == 1
+    
+    with pytest.raises(KeyError):
+        db.fetch_cursor(cursor_id, 2)
+
+
+def test_close(db):
+    """测试关闭连接"""
+    pool = db.pool
+    
+    # 关闭连接
+    db.close()
+    
+    # 验证连接池被清空
+    assert pool._remove_connections.call_count == 1
+    assert db.pool is None
 
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    pytest.main([__file__])
\ No newline at end of file
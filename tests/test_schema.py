@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模式管理模块测试
+
+这个模块测试数据库模式的缓存功能。
+"""
+
+from unittest.mock import call, MagicMock
+
+import pytest
+from mysql.connector.errors import OperationalError
+
+from mysql_mcp.database import MySQLDatabase
+from mysql_mcp.schema import SchemaManager
+from mysql_mcp.security import SecurityManager
+from mysql_mcp.tools import register_tools
+
+
+@pytest.fixture
+def mock_db():
+    """模拟的数据库"""
+    database = MagicMock(spec=MySQLDatabase)
+    database.get_schema_version.return_value = ("2024-01-01 00:00:00", None, 1)
+    return database
+
+
+@pytest.fixture
+def fetcher():
+    """模拟的模式查询函数"""
+    return MagicMock(return_value={"database": "test_db", "tables": []})
+
+
+@pytest.fixture
+def schema_manager():
+    """启用缓存的模式管理器"""
+    return SchemaManager("test_db")
+
+
+def test_cache_hit(mock_db, fetcher, schema_manager):
+    """测试模式版本未变化时使用缓存"""
+    first = schema_manager.get_or_refresh(mock_db, "schema", fetcher)
+    second = schema_manager.get_or_refresh(mock_db, "schema", fetcher)
+    
+    # 验证只查询了一次
+    assert first is second
+    assert fetcher.call_count == 1
+    assert mock_db.get_schema_version.call_count == 2
+
+
+def test_cache_invalidated(mock_db, fetcher, schema_manager):
+    """测试模式版本变化时重新查询"""
+    schema_manager.get_or_refresh(mock_db, "schema", fetcher)
+    
+    # 模拟表结构变更
+    mock_db.get_schema_version.return_value = ("2024-01-02 00:00:00", None, 1)
+    schema_manager.get_or_refresh(mock_db, "schema", fetcher)
+    
+    # 验证重新查询
+    assert fetcher.call_count == 2
+
+
+def test_failed_schema_not_cached(db, mock_connection, mock_db, schema_manager):
+    """测试获取模式失败的结果不被缓存，数据库恢复后重新查询"""
+    mock_cursor = mock_connection.cursor.return_value
+    mock_cursor.execute.side_effect = [OperationalError("连接中断"), None]
+    mock_cursor.fetchall.return_value = [("users", "id", "int", "NO", "PRI", None, "")]
+    
+    failed = schema_manager.get_or_refresh(mock_db, "schema", db.get_schema)
+    assert failed["tables"] == []
+    assert not failed["success"]
+    
+    # 验证重新查询并返回恢复后的模式
+    schema = schema_manager.get_or_refresh(mock_db, "schema", db.get_schema)
+    assert [table["name"] for table in schema["tables"]] == ["users"]
+    assert mock_cursor.execute.call_count == 2
+
+
+def test_cache_disabled(mock_db, fetcher):
+    """测试禁用缓存"""
+    schema_manager = SchemaManager("test_db", cache_enabled=False)
+    
+    schema_manager.get_or_refresh(mock_db, "schema", fetcher)
+    schema_manager.get_or_refresh(mock_db, "schema", fetcher)
+    
+    # 验证不查询模式版本，每次都重新查询
+    assert fetcher.call_count == 2
+    assert mock_db.get_schema_version.call_count == 0
+
+
+def test_update_relations_from_tuples(schema_manager):
+    """测试使用元组结果行更新表关系"""
+    schema_manager.update_relations([
+        ("orders", "user_id", "users", "id"),
+        {"table_name": "items", "column_name": "order_id", "referenced_table": "orders", "referenced_column": "id"}
+    ])
+    
+    # 验证按表过滤关系
+    relations = schema_manager.get_table_relations("users")
+    assert relations == [
+        {"table_name": "orders", "column_name": "user_id", "referenced_table": "users", "referenced_column": "id"}
+    ]
+    assert len(schema_manager.get_table_relations("orders")) == 2
+
+
+def test_get_table_info_lazy(mock_db):
+    """测试按需加载表信息"""
+    table = {"name": "users", "columns": []}
+    mock_db.get_schema.return_value = {"database": "test_db", "tables": [table]}
+    schema_manager = SchemaManager("test_db", database=mock_db)
+    
+    # 首次获取时查询，之后使用已加载的信息
+    assert schema_manager.get_table_info("users") == table
+    assert schema_manager.get_table_info("users") == table
+    assert mock_db.get_schema.call_args_list == [call(["users"])]
+
+
+def test_get_table_info_missing(mock_db):
+    """测试获取不存在的表信息"""
+    mock_db.get_schema.return_value = {"database": "test_db", "tables": []}
+    schema_manager = SchemaManager("test_db", database=mock_db)
+    
+    assert schema_manager.get_table_info("missing") is None
+
+
+def test_prewarm(mock_db):
+    """测试预加载的模式信息供之后的get_schema工具直接使用"""
+    mock_db.get_schema.side_effect = lambda tables=None: {
+        "database": "test_db",
+        "tables": [{"name": table, "columns": []} for table in tables]
+    }
+    schema_manager = SchemaManager("test_db", database=mock_db)
+    security = SecurityManager(allowed_tables=["users", "products"])
+    
+    schema_manager.prewarm(security.allowed_tables, jitter_seconds=0)
+    assert sorted(schema_manager.tables) == ["products", "users"]
+    
+    # 模式版本未变化时从缓存返回，不再查询表结构
+    schema = register_tools(mock_db, security, schema_manager).get_tool("get_schema")()
+    assert [table["name"] for table in schema["tables"]] == ["users", "products"]
+    assert mock_db.get_schema.call_args_list == [call(["users", "products"])]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+安全模块测试
+
+这个模块测试SQL查询验证和标识符处理功能。
+"""
+
+import pytest
+
+from mysql_mcp.security import SecurityManager, _quote_ident, limit_position, parse_operation, tokenize
+
+
+@pytest.fixture(scope="module")
+def security():
+    """允许访问users和products表的安全管理器，实例没有可变状态，模块内共用"""
+    return SecurityManager(allowed_tables=["Users", "products"])
+
+
+def test_valid_identifier():
+    """测试合法的标识符"""
+    assert _quote_ident("users") == "`users`"
+    assert _quote_ident("order_items$2") == "`order_items$2`"
+    assert _quote_ident("a" * 64) == "`" + "a" * 64 + "`"
+
+
+def test_invalid_identifier():
+    """测试非法的标识符"""
+    for name in ["", "a" * 65, "users`; DROP TABLE users", "user name", "db.users", None]:
+        with pytest.raises(ValueError):
+            _quote_ident(name)
+
+
+def test_skip_comments_and_strings():
+    """测试跳过注释并识别字符串"""
+    tokens = list(tokenize("/* c */ SELECT `a``b`, 'x -- y' -- z\nFROM t # w"))
+    assert tokens == [
+        ("word", "SELECT"), ("ident", "a`b"), ("symbol", ","), ("string", "'x -- y'"),
+        ("word", "FROM"), ("word", "t")
+    ]
+
+
+def test_parse_operation():
+    """测试提取操作类型"""
+    assert parse_operation("  select 1") == "SELECT"
+    assert parse_operation("/* SELECT */ DROP TABLE users") == "DROP"
+    assert parse_operation("/*!50000 DROP */ TABLE users") == "DROP"
+    assert parse_operation("-- only a comment") is None
+
+
+def test_limit_position():
+    """测试查找插入LIMIT的位置"""
+    assert limit_position("SELECT * FROM users") == 19
+    assert limit_position("SELECT * FROM users ORDER BY id") == 31
+    assert limit_position("SELECT * FROM (SELECT * FROM users LIMIT 5) t") == 45
+    assert limit_position("SELECT * FROM users WHERE name = 'LIMIT'") == 40
+    assert limit_position("SELECT ';' FROM users") == 21
+    assert limit_position("SELECT * FROM users LIMIT 10") is None
+    assert limit_position("SELECT * FROM users FOR UPDATE") is None
+    assert limit_position("SHOW TABLES") is None
+    
+    # 末尾的分号之后只有空白或注释时，LIMIT插入到分号之前
+    assert limit_position("SELECT 1;") == 8
+    assert limit_position("SELECT * FROM users; # end") == 19
+    assert limit_position("SELECT 1 ; /* end; */ -- ;") == 9
+    assert limit_position("SELECT 1; SELECT 2") is None
+    assert limit_position("SELECT 1 LIMIT 1;") is None
+    assert limit_position("SHOW TABLES;") is None
+
+
+def test_validate_query(security):
+    """测试查询验证"""
+    assert security.validate_query("SELECT * FROM users") == (True, "SELECT")
+    assert security.validate_query("  select * from `products`") == (True, "SELECT")
+    assert security.validate_query("SELECT * FROM (users) JOIN (products) ON 1") == (True, "SELECT")
+    assert security.validate_query("SELECT * FROM (SELECT * FROM users) t, products") == (True, "SELECT")
+    assert security.validate_query("SELECT * FROM users STRAIGHT_JOIN products") == (True, "SELECT")
+    assert security.validate_query("SELECT * FROM users UNION TABLE products") == (True, "SELECT")
+    assert security.validate_query("SHOW TABLE STATUS") == (True, "SHOW")
+
+
+def test_validate_query_rejected(security):
+    """测试被拒绝的查询"""
+    assert security.validate_query("") == (False, None)
+    assert security.validate_query("DROP TABLE users") == (False, "DROP")
+    assert security.validate_query("SELECT * FROM orders") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM users, orders") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM (orders)") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM users, (orders)") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM users JOIN (orders) ON 1") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM ((users), orders)") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM users STRAIGHT_JOIN orders") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM users UNION TABLE orders") == (False, "SELECT")
+    assert security.validate_query("SELECT * FROM users WHERE id IN (TABLE orders)") == (False, "SELECT")
+    assert security.validate_query("/* SELECT */ DROP TABLE users") == (False, "DROP")
+
+
+def test_validate_query_ignores_strings(security):
+    """测试字符串和注释中的表名不被检查"""
+    assert security.validate_query("SELECT 'FROM orders' FROM users /* JOIN orders */") == (True, "SELECT")
+
+
+def test_is_table_allowed(security):
+    """测试表访问检查不区分大小写"""
+    assert security.is_table_allowed("users")
+    assert security.is_table_allowed("PRODUCTS")
+    assert not security.is_table_allowed("orders")
+    
+    # 未指定允许的表时所有表都允许访问
+    assert SecurityManager().is_table_allowed("orders")
+
+
+def test_is_dangerous_query(security):
+    """测试危险查询检查"""
+    assert security.is_dangerous_query("SELECT 1; DROP TABLE users")
+    assert security.is_dangerous_query("SELECT * FROM users -- comment")
+    assert not security.is_dangerous_query("SELECT * FROM users WHERE id = 1")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
\ No newline at end of file
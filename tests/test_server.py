@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务器模块测试
+
+这个模块测试MCP响应的编码功能。
+"""
+
+import asyncio
+import decimal
+import time
+from unittest.mock import MagicMock
+
+import orjson
+import pytest
+from mysql.connector.errors import OperationalError
+
+import server
+from mysql_mcp.database import MySQLDatabase, QueryStream
+from mysql_mcp.security import SecurityManager
+from server import MCPRequest, _dumps, handle_mcp_request, max_streams, stream_mcp_result
+
+
+async def _read(parts):
+    """读完流式响应并解析为JSON"""
+    return orjson.loads(b"".join([part async for part in parts]))
+
+
+def _collect(stream):
+    """读完流式查询结果的响应并解析为JSON"""
+    return asyncio.run(_read(stream_mcp_result(stream)))
+
+
+def test_dumps_decimal():
+    """测试DECIMAL值的序列化"""
+    assert _dumps([decimal.Decimal("12"), decimal.Decimal("1.5")]) == b"[12,1.5]"
+    assert _dumps(decimal.Decimal(2 ** 64 - 1)) == b"18446744073709551615"
+    
+    # 超出64位整数范围的值以字符串输出
+    assert _dumps(decimal.Decimal(2 ** 64)) == b'"18446744073709551616"'
+    assert _dumps(decimal.Decimal("-1E+30")) == b'"-1000000000000000000000000000000"'
+
+
+def test_stream_mcp_result():
+    """测试流式响应的结构与execute_query的结果一致"""
+    cursor = MagicMock(description=[("id",)])
+    cursor.fetchmany.side_effect = [[{"id": 1}, {"id": 2}], [{"id": 3}]]
+    stream = QueryStream(MagicMock(), cursor, max_rows=5, chunk_size=2, start_time=time.time())
+    
+    response = _collect(stream)
+    assert response["error"] is None
+    assert response["result"]["success"]
+    assert response["result"]["rows"] == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert response["result"]["row_count"] == 3
+    assert not response["result"]["has_more"]
+
+
+def test_stream_mcp_result_fetch_error():
+    """测试读取失败时返回完整的错误响应，success为false"""
+    connection = MagicMock()
+    cursor = MagicMock(description=[("id",)])
+    cursor.fetchmany.side_effect = [[{"id": 1}], OperationalError("连接中断")]
+    stream = QueryStream(connection, cursor, max_rows=5, chunk_size=1, start_time=time.time())
+    
+    response = _collect(stream)
+    assert not response["result"]["success"]
+    assert response["result"]["rows"] == [{"id": 1}]
+    assert "连接中断" in response["error"]
+    
+    # 验证没有再读取剩余结果，连接已归还
+    assert cursor.fetchmany.call_count == 2
+    assert connection.close.call_count == 1
+
+
+def test_max_streams():
+    """测试流式响应数上限小于连接池大小"""
+    assert max_streams({}, 8) == 4
+    assert max_streams({"database": {"max_streams": 8}}, 8) == 7
+    assert max_streams({"database": {"max_streams": 0}}, 8) == 1
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    """替换为模拟数据库的服务器全局状态，流式响应名额为1"""
+    database = MagicMock(spec=MySQLDatabase)
+    monkeypatch.setattr(server, "database", database)
+    monkeypatch.setattr(server, "security", SecurityManager())
+    monkeypatch.setattr(server, "stream_slots", asyncio.Semaphore(1))
+    return database
+
+
+def test_stream_slots_exhausted(mock_server):
+    """测试流式响应数达到上限时一次读完结果再返回"""
+    mock_server.execute_query.return_value = {"success": True, "rows": [{"id": 1}]}
+    
+    async def request():
+        await server.stream_slots.acquire()
+        response = await handle_mcp_request(MCPRequest(query="SELECT id FROM users"))
+        return await _read(response.body_iterator)
+    
+    assert asyncio.run(request()) == {"result": {"success": True, "rows": [{"id": 1}]}, "error": None}
+    assert mock_server.stream_query.call_count == 0
+
+
+def test_stream_response_not_started(mock_server):
+    """测试响应开始前不获取流式响应名额和连接"""
+    async def request():
+        await handle_mcp_request(MCPRequest(query="SELECT id FROM users"))
+    
+    asyncio.run(request())
+    assert mock_server.stream_query.call_count == 0
+    assert not server.stream_slots.locked()
+
+
+def test_stream_slot_released(mock_server):
+    """测试流式响应结束后归还连接并释放名额"""
+    stream = MagicMock(spec=QueryStream, columns=["id"], row_count=1, has_more=False, execution_time=0.1)
+    stream.fetch.side_effect = [[{"id": 1}], []]
+    mock_server.stream_query.return_value = stream
+    
+    async def request():
+        response = await handle_mcp_request(MCPRequest(query="SELECT id FROM users"))
+        return await _read(response.body_iterator)
+    
+    assert asyncio.run(request())["result"]["rows"] == [{"id": 1}]
+    assert stream.close.call_count == 1
+    assert not server.stream_slots.locked()
+
+
+@pytest.mark.parametrize("slot_free", [True, False])
+def test_query_error_shape(mock_server, slot_free):
+    """测试查询失败的响应结构与是否流式输出无关"""
+    mock_server.stream_query.side_effect = OperationalError("语法错误")
+    mock_server.execute_query.return_value = {"success": False, "error": str(OperationalError("语法错误"))}
+    
+    async def request():
+        if not slot_free:
+            await server.stream_slots.acquire()
+        response = await handle_mcp_request(MCPRequest(query="SELECT id FROM users"))
+        return await _read(response.body_iterator)
+    
+    assert asyncio.run(request()) == {
+        "result": {"success": False, "error": str(OperationalError("语法错误"))},
+        "error": None
+    }
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
\ No newline at end of file
@@ -7,157 +7,291 @@ MCP工具测试
 这个模块测试MySQL MCP工具的功能。
 """
 
-import unittest
-from unittest.mock import patch, MagicMock
+import sys
+from types import MappingProxyType, SimpleNamespace
+from unittest.mock import call, create_autospec
 
-from mysql_mcp.database import MySQLDatabase
+import pytest
+
+from mysql_mcp.schema import SchemaManager
 from mysql_mcp.security import SecurityManager
 from mysql_mcp.tools import register_tools
 
+# 多次比较的中文测试数据，驻留后相等比较可以直接比较对象
+_ZH_TEST = sys.intern("测试")
+
+# 多个测试共用的SQL语句
+SQL_SELECT_USERS = sys.intern("SELECT * FROM users")
+SQL_DROP_USERS = sys.intern("DROP TABLE users")
+SQL_DELETE_USERS = sys.intern("DELETE FROM users")
+SQL_DESC_USERS = sys.intern("DESCRIBE `users`")
+
+# 测试用到的工具
+TOOL_NAMES = ("execute_query", "paginated_query", "get_schema", "get_table_structure",
+              "analyze_data", "get_table_relations")
+
+
+class _StubDB:
+    """记录调用的数据库替身
+    
+    只实现工具用到的方法，构造和调用都比MagicMock轻量得多。
+    """
+    
+    def __init__(self):
+        self.calls = []
+        # 各方法的返回值，按方法名设置
+        self.returns = {}
+    
+    def reset(self):
+        """清除调用记录和返回值"""
+        self.calls.clear()
+        self.returns.clear()
+    
+    def _call(self, name, args, kwargs):
+        self.calls.append((name, args, kwargs))
+        return self.returns.get(name)
+    
+    def execute_query(self, *args, **kwargs):
+        return self._call("execute_query", args, kwargs)
+    
+    def open_cursor(self, *args, **kwargs):
+        return self._call("open_cursor", args, kwargs)
+    
+    def fetch_cursor(self, *args, **kwargs):
+        return self._call("fetch_cursor", args, kwargs)
+    
+    def get_schema(self, *args, **kwargs):
+        return self._call("get_schema", args, kwargs)
+    
+    def get_schema_version(self, *args, **kwargs):
+        return self._call("get_schema_version", args, kwargs)
+
+
+@pytest.fixture(scope="module")
+def stub_db():
+    """模块内共用的数据库替身"""
+    return _StubDB()
+
+
+@pytest.fixture(scope="module")
+def mock_security():
+    """模块内共用的模拟安全管理器，按类的接口生成模拟对象只需进行一次
+    
+    以实例为规格，__init__中设置的allowed_tables和max_rows也在规格内，
+    spec_set使设置不存在的属性时报错。
+    """
+    return create_autospec(SecurityManager(), spec_set=True)
+
+
+@pytest.fixture(scope="module")
+def tools(stub_db, mock_security):
+    """注册的MCP工具，工具在调用时才读取数据库和安全管理器的状态，注册和查找只需进行一次"""
+    registry = register_tools(stub_db, mock_security)
+    return SimpleNamespace(**{name: registry.get_tool(name) for name in TOOL_NAMES})
+
+
+@pytest.fixture(autouse=True)
+def reset_mocks(stub_db, mock_security):
+    """清除上一个测试留下的调用记录和返回值"""
+    stub_db.reset()
+    mock_security.reset_mock(return_value=True, side_effect=True)
+    
+    # 设置安全管理器属性
+    mock_security.allowed_tables = ["users", "products"]
+    mock_security.is_table_allowed.side_effect = lambda name: name.casefold() in ("users", "products")
+    mock_security.max_rows = 100
+
+
+# 执行查询工具返回的查询结果，只读且所有测试共用
+_QUERY_RESULT = MappingProxyType({"success": True, "rows": (MappingProxyType({"id": 1, "name": _ZH_TEST}),)})
+
+
+@pytest.mark.parametrize("validation, dangerous, query, expected, expected_calls", [
+    ((True, "SELECT"), False, SQL_SELECT_USERS, _QUERY_RESULT,
+     [("execute_query", (SQL_SELECT_USERS, 100), {"op": "SELECT"})]),
+    ((False, "DROP"), False, SQL_DROP_USERS, {"success": False, "error": "查询操作不被允许"}, []),
+    ((True, "DELETE"), True, SQL_DELETE_USERS, {"success": False, "error": "查询包含危险操作"}, []),
+], ids=["allowed", "not_allowed", "dangerous"])
+def test_execute_query_tool(stub_db, mock_security, tools, validation, dangerous, query, expected,
+                            expected_calls):
+    """测试执行查询工具，以及不允许的查询和危险查询"""
+    # 设置验证结果
+    mock_security.validate_query.return_value = validation
+    mock_security.is_dangerous_query.return_value = dangerous
+    
+    # 设置查询结果
+    stub_db.returns["execute_query"] = _QUERY_RESULT
+    
+    # 执行工具
+    result = tools.execute_query(query)
+    
+    # 验证结果
+    assert result == expected
+    assert mock_security.validate_query.call_args_list == [call(query)]
+    if validation[0]:
+        assert mock_security.is_dangerous_query.call_args_list == [call(query)]
+    assert stub_db.calls == expected_calls
+
+
+def test_paginated_query_tool(stub_db, mock_security, tools):
+    """测试分页查询工具"""
+    # 设置验证结果
+    mock_security.validate_query.return_value = (True, "SELECT")
+    mock_security.is_dangerous_query.return_value = False
+    
+    # 设置游标结果
+    stub_db.returns["open_cursor"] = "cursor-1"
+    stub_db.returns["fetch_cursor"] = ([{"id": 1}], False)
+    
+    # 首次调用打开游标
+    result = tools.paginated_query(SQL_SELECT_USERS, 1)
+    
+    # 验证结果
+    assert result["cursor_id"] == "cursor-1"
+    assert result["rows"] == [{"id": 1}]
+    assert result["has_more"]
+    assert stub_db.calls == [
+        ("open_cursor", (SQL_SELECT_USERS,), {}),
+        ("fetch_cursor", ("cursor-1", 1), {})
+    ]
+
+
+def test_paginated_query_next_page(stub_db, mock_security, tools):
+    """测试使用游标ID读取下一页"""
+    # 设置最后一页结果
+    stub_db.returns["fetch_cursor"] = ([{"id": 2}], True)
+    
+    # 执行工具
+    result = tools.paginated_query(cursor_id="cursor-1", page_size=500)
+    
+    # 验证结果：页大小受最大返回行数限制，且不再重新验证查询
+    assert result["cursor_id"] is None
+    assert not result["has_more"]
+    assert stub_db.calls == [("fetch_cursor", ("cursor-1", 100), {})]
+    assert mock_security.validate_query.call_count == 0
+
+
+def test_get_schema_tool(stub_db, tools):
+    """测试获取模式工具"""
+    # 设置模式结果
+    expected_schema = {"database": "test_db", "tables": []}
+    stub_db.returns["get_schema"] = expected_schema
+    
+    # 执行工具
+    result = tools.get_schema()
+    
+    # 验证结果
+    assert result == expected_schema
+    assert stub_db.calls == [("get_schema", (["users", "products"],), {})]
+
+
+def test_get_table_structure_tool(stub_db, tools):
+    """测试获取表结构工具"""
+    # 设置表结构结果
+    expected_result = {"success": True, "rows": []}
+    stub_db.returns["execute_query"] = expected_result
+    
+    # 执行工具
+    result = tools.get_table_structure("users")
+    
+    # 验证结果
+    assert result == expected_result
+    assert stub_db.calls == [("execute_query", (SQL_DESC_USERS,), {})]
+
+
+def test_get_table_structure_uncached(stub_db, mock_security):
+    """测试表结构工具不经过模式缓存"""
+    # 设置表结构结果
+    expected_result = {"success": True, "rows": []}
+    stub_db.returns["execute_query"] = expected_result
+    
+    # 使用模式管理器注册工具
+    registry = register_tools(stub_db, mock_security, SchemaManager("test_db"))
+    tool = registry.get_tool("get_table_structure")
+    
+    # 连续调用两次
+    assert tool("users") == expected_result
+    assert tool("users") == expected_result
+    
+    # 验证每次只执行DESCRIBE，不查询模式版本
+    assert stub_db.calls == [("execute_query", (SQL_DESC_USERS,), {})] * 2
 
-class TestMCPTools(unittest.TestCase):
-    """测试MCP工具"""
-    
-    def setUp(self):
-        """测试前准备"""
-        # 模拟数据库和安全管理器
-        self.mock_db = MagicMock(spec=MySQLDatabase)
-        self.mock_security = MagicMock(spec=SecurityManager)
-        
-        # 设置安全管理器属性
-        self.mock_security.allowed_tables = ["users", "products"]
-        self.mock_security.max_rows = 100
-        
-        # 注册工具
-        self.registry = register_tools(self.mock_db, self.mock_security)
-    
-    def test_execute_query_tool(self):
-        """测试执行查询工具"""
-        # 设置验证结果
-        self.mock_security.validate_query.return_value = True
-        self.mock_security.is_dangerous_query.return_value = False
-        
-        # 设置查询结果
-        expected_result = {"success": True, "rows": [{"id": 1, "name": "测试"}]}
-        self.mock_db.execute_query.return_value = expected_result
-        
-        # 执行工具
-        tool = self.registry.get_tool("execute_query")
-        result = tool("SELECT * FROM users")
-        
-        # 验证结果
-        self.assertEqual(result, expected_result)
-        self.mock_security.validate_query.assert_called_once_with("SELECT * FROM users")
-        self.mock_security.is_dangerous_query.assert_called_once_with("SELECT * FROM users")
-        self.mock_db.execute_query.assert_called_once_with("SELECT * FROM users", self.mock_security.max_rows)
-    
-    def test_execute_query_not_allowed(self):
-        """测试不允许的查询"""
-        # 设置验证结果
-        self.mock_security.validate_query.return_value = False
-        
-        # 执行工具
-        tool = self.registry.get_tool("execute_query")
-        result = tool("DROP TABLE users")
-        
-        # 验证结果
-        self.assertEqual(result, {"success": False, "error": "查询操作不被允许"})
-        self.mock_db.execute_query.assert_not_called()
-    
-    def test_execute_dangerous_query(self):
-        """测试危险查询"""
-        # 设置验证结果
-        self.mock_security.validate_query.return_value = True
-        self.mock_security.is_dangerous_query.return_value = True
-        
-        # 执行工具
-        tool = self.registry.get_tool("execute_query")
-        result = tool("DELETE FROM users")
-        
-        # 验证结果
-        self.assertEqual(result, {"success": False, "error": "查询包含危险操作"})
-        self.mock_db.execute_query.assert_not_called()
-    
-    def test_get_schema_tool(self):
-        """测试获取模式工具"""
-        # 设置模式结果
-        expected_schema = {"database": "test_db", "tables": []}
-        self.mock_db.get_schema.return_value = expected_schema
-        
-        # 执行工具
-        tool = self.registry.get_tool("get_schema")
-        result = tool()
-        
-        # 验证结果
-        self.assertEqual(result, expected_schema)
-        self.mock_db.get_schema.assert_called_once_with(self.mock_security.allowed_tables)
-    
-    def test_get_table_structure_tool(self):
-        """测试获取表结构工具"""
-        # 设置表结构结果
-        expected_result = {"success": True, "rows": []}
-        self.mock_db.execute_query.return_value = expected_result
-        
-        # 执行工具
-        tool = self.registry.get_tool("get_table_structure")
-        result = tool("users")
-        
-        # 验证结果
-        self.assertEqual(result, expected_result)
-        self.mock_db.execute_query.assert_called_once_with("DESCRIBE `users`")
-    
-    def test_get_table_structure_not_allowed(self):
-        """测试不允许的表结构查询"""
-        # 执行工具
-        tool = self.registry.get_tool("get_table_structure")
-        result = tool("forbidden_table")
-        
-        # 验证结果
-        self.assertEqual(result, {"success": False, "error": "表 forbidden_table 不被允许访问"})
-        self.mock_db.execute_query.assert_not_called()
-    
-    def test_analyze_data_tool(self):
-        """测试分析数据工具"""
-        # 设置分析结果
-        expected_result = {"success": True, "rows": [{"total_rows": 10}]}
-        self.mock_db.execute_query.return_value = expected_result
-        
-        # 执行工具
-        tool = self.registry.get_tool("analyze_data")
-        result = tool("users")
-        
-        # 验证结果
-        self.assertEqual(result, expected_result)
-        self.mock_db.execute_query.assert_called_once()
-    
-    def test_analyze_data_with_column(self):
-        """测试带列的数据分析"""
-        # 设置分析结果
-        expected_result = {"success": True, "rows": [{"total_rows": 10, "unique_values": 5}]}
-        self.mock_db.execute_query.return_value = expected_result
-        
-        # 执行工具
-        tool = self.registry.get_tool("analyze_data")
-        result = tool("users", "name")
-        
-        # 验证结果
-        self.assertEqual(result, expected_result)
-        self.mock_db.execute_query.assert_called_once()
-    
-    def test_get_table_relations_tool(self):
-        """测试获取表关系工具"""
-        # 设置关系结果
-        expected_result = {"success": True, "rows": []}
-        self.mock_db.execute_query.return_value = expected_result
-        
-        # 执行工具
-        tool = self.registry.get_tool("get_table_relations")
-        result = tool()
-        
-        # 验证结果
-        self.assertEqual(result, expected_result)
-        self.mock_db.execute_query.assert_called_once()
+
+def test_get_table_structure_not_allowed(stub_db, tools):
+    """测试不允许的表结构查询"""
+    # 执行工具
+    result = tools.get_table_structure("forbidden_table")
+    
+    # 验证结果
+    assert result == {"success": False, "error": "表 forbidden_table 不被允许访问"}
+    assert stub_db.calls == []
+
+
+def test_analyze_data_invalid_column(stub_db, tools):
+    """测试非法的列名"""
+    # 执行工具
+    result = tools.analyze_data("users", "name`) FROM users; --")
+    
+    # 验证结果
+    assert not result["success"]
+    assert "非法的标识符" in result["error"]
+    assert stub_db.calls == []
+
+
+@pytest.mark.parametrize("column_names, query_result, expected", [
+    (None, {"success": True, "rows": [{"total_rows": 10}]}, {"success": True, "rows": [{"total_rows": 10}]}),
+    ("name", {"success": True, "rows": [(10, 5, "a", "z", None)], "execution_time": 0.01}, {
+        "success": True,
+        "total_rows": 10,
+        "columns": {"name": {"unique_values": 5, "min_value": "a", "max_value": "z", "avg_value": None}},
+        "execution_time": 0.01
+    }),
+], ids=["table", "column"])
+def test_analyze_data_tool(stub_db, tools, column_names, query_result, expected):
+    """测试分析整个表和单个列的数据"""
+    # 设置分析结果
+    stub_db.returns["execute_query"] = query_result
+    
+    # 执行工具
+    result = tools.analyze_data("users", column_names)
+    
+    # 验证结果
+    assert result == expected
+    assert len(stub_db.calls) == 1
+
+
+def test_analyze_data_multiple_columns(stub_db, tools):
+    """测试在一条查询中分析多列"""
+    # 设置分析结果
+    stub_db.returns["execute_query"] = {
+        "success": True, "rows": [(10, 5, "a", "z", None, 10, 1, 10, 5.5)], "execution_time": 0.01
+    }
+    
+    # 执行工具
+    result = tools.analyze_data("users", ["name", "id", "name"])
+    
+    # 验证只执行了一次查询，且按列名返回统计值
+    assert len(stub_db.calls) == 1
+    query = stub_db.calls[0][1][0]
+    assert query.count("FROM") == 1
+    assert "COUNT(DISTINCT `id`)" in query
+    assert list(result["columns"]) == ["name", "id"]
+    assert result["columns"]["id"]["avg_value"] == 5.5
+
+
+def test_get_table_relations_tool(stub_db, tools):
+    """测试获取表关系工具"""
+    # 设置关系结果
+    expected_result = {"success": True, "rows": []}
+    stub_db.returns["execute_query"] = expected_result
+    
+    # 执行工具
+    result = tools.get_table_relations()
+    
+    # 验证结果
+    assert result == expected_result
+    assert len(stub_db.calls) == 1
 
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    pytest.main([__file__])
\ No newline at end of file